@@ -0,0 +1,62 @@
+"""
+Wall time of rendering the candidates PDF report on a single canvas versus
+sharded across the process pool, as the number of candidates grows.
+The sharded time should drop roughly with the number of workers.
+
+Run from the backend directory:
+    python -m benchmarks.bench_report_rendering
+RASTERIZE_WORKERS sets the number of worker processes (default: one per core).
+"""
+import asyncio
+import io
+import random
+import time
+from services.generatePDF import create_candidates_pdf
+from services.rasterizer import RASTERIZE_WORKERS, shutdown_executor
+from services.reports import render_report
+
+CANDIDATE_COUNTS = [50, 200, 500]
+CRITERIA_COUNT = 7
+WORDS = "experienced engineer python distributed systems leadership cloud delivery mentoring".split()
+
+def fake_text(rng: random.Random, word_count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(word_count))
+
+def fake_candidates(count: int):
+    rng = random.Random(count)
+    return [
+        {
+            "index": i + 1,
+            "filename": f"cv_{i}.pdf",
+            "candidate_name": f"Candidate {i}",
+            "summary": fake_text(rng, 120),
+            "total_score": round(rng.uniform(0, 10), 1),
+            "scores": [
+                {"criterion": f"Criterion {c}", "score": round(rng.uniform(0, 10), 1), "explanation": fake_text(rng, 60)}
+                for c in range(CRITERIA_COUNT)
+            ]
+        }
+        for i in range(count)
+    ]
+
+async def main():
+    print(f"workers: {RASTERIZE_WORKERS}")
+    print(f"{'candidates':>10} {'single ms':>10} {'sharded ms':>11} {'speedup':>8}")
+    # Warm up the worker processes so spawning them is not timed
+    await render_report(fake_candidates(CANDIDATE_COUNTS[0]), io.BytesIO())
+    for count in CANDIDATE_COUNTS:
+        candidates = fake_candidates(count)
+
+        start = time.perf_counter()
+        create_candidates_pdf(candidates)
+        single_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        await render_report(candidates, io.BytesIO())
+        sharded_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{count:>10} {single_ms:>10.1f} {sharded_ms:>11.1f} {single_ms / sharded_ms:>8.2f}")
+    shutdown_executor()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+"""
+Deterministic stand-in for a real LLM provider, for benchmarks and load tests.
+
+Every request sleeps for a latency drawn from a log-normal distribution and may fail
+with a rate limit (429) or server (500) error. Requests go through the same rate limit
+scheduler as the real providers, so pacing, AIMD concurrency and retries are exercised.
+Draws are seeded by the request content and attempt number, so a run is reproducible
+regardless of the order in which requests are scheduled.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+from typing import Any, Dict, List
+from services.llm_service import BaseLLMService
+
+# Median latency (seconds) of vision (OCR) and text (scoring) requests
+FAKE_LLM_VISION_LATENCY = float(os.getenv("FAKE_LLM_VISION_LATENCY", "1.0"))
+FAKE_LLM_TEXT_LATENCY = float(os.getenv("FAKE_LLM_TEXT_LATENCY", "2.0"))
+# Spread of the log-normal latency distribution; 0 gives a constant latency
+FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5"))
+# Share of requests failing with a server error and with a rate limit error
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0.01"))
+FAKE_LLM_RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0.02"))
+# Provider whose rate limits (e.g. OPENAI_RPM/OPENAI_TPM) and image preprocessing are used
+FAKE_LLM_PROVIDER = os.getenv("FAKE_LLM_PROVIDER", "openai")
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+CV_FILE_HEADER = re.compile(r"=== CV file: (.*?) ===")
+WORDS = (
+    "led designed delivered migrated scaled mentored automated reduced improved built "
+    "python java kubernetes postgres kafka react aws terraform analytics platform team "
+    "customers pipeline latency revenue reliability compliance roadmap stakeholders"
+).split()
+
+class FakeRateLimitError(Exception):
+    """Recognized as a 429 by services.rate_limiter"""
+    status_code = 429
+
+class FakeServerError(Exception):
+    """Recognized as a transient 5xx by services.rate_limiter"""
+    status_code = 500
+
+def message_digest(messages: List[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+
+def fake_sentence(rng: random.Random, word_count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(word_count)).capitalize() + "."
+
+def scoring_criteria(messages: List[Dict[str, Any]]) -> List[str]:
+    """Criterion names listed in the scoring system prompt"""
+    prompt = messages[0]["content"]
+    criteria_block = prompt.split("Criteria (with descriptions):", 1)[-1].split("\n\n", 1)[0]
+    return [
+        line[2:].split(":", 1)[0]
+        for line in criteria_block.strip().split("\n")
+        if line.startswith("- ")
+    ]
+
+class FakeLLMService(BaseLLMService):
+    """LLM service answering OCR and scoring requests with synthetic, well-formed responses"""
+
+    model_name = "fake-text"
+    vision_model_name = "fake-vision"
+
+    def __init__(
+        self,
+        vision_latency: float = FAKE_LLM_VISION_LATENCY,
+        text_latency: float = FAKE_LLM_TEXT_LATENCY,
+        latency_sigma: float = FAKE_LLM_LATENCY_SIGMA,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        rate_limit_rate: float = FAKE_LLM_RATE_LIMIT_RATE,
+        provider: str = FAKE_LLM_PROVIDER,
+        seed: int = FAKE_LLM_SEED
+    ):
+        self.provider = provider
+        self.vision_latency = vision_latency
+        self.text_latency = text_latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.seed = seed
+        self.attempts: Dict[str, int] = {}
+        self.counts = {"requests": 0, "rate_limited": 0, "errors": 0}
+
+    def request_rng(self, digest: str) -> random.Random:
+        """Random generator of one attempt of a request"""
+        attempt = self.attempts.get(digest, 0)
+        self.attempts[digest] = attempt + 1
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    async def fake_call(self, digest: str, median_latency: float, response: str) -> str:
+        rng = self.request_rng(digest)
+        self.counts["requests"] += 1
+        latency = median_latency * math.exp(rng.gauss(0, self.latency_sigma)) if median_latency > 0 else 0
+        outcome = rng.random()
+        if outcome < self.rate_limit_rate:
+            # Rate limited requests are rejected right away, like a real 429
+            self.counts["rate_limited"] += 1
+            raise FakeRateLimitError("Rate limit exceeded")
+        await asyncio.sleep(latency)
+        if outcome < self.rate_limit_rate + self.error_rate:
+            self.counts["errors"] += 1
+            raise FakeServerError("Internal server error")
+        return response
+
+    async def run(self, model: str, messages: List[Dict[str, Any]], digest: str, median_latency: float, response: str) -> str:
+        return await self.schedule(model, messages, lambda: self.fake_call(digest, median_latency, response))
+
+    def fake_scores(self, rng: random.Random, criteria: List[str]) -> Dict[str, dict]:
+        return {
+            name: {"score": round(rng.uniform(2, 10), 1), "explanation": fake_sentence(rng, 12)}
+            for name in criteria
+        }
+
+    def fake_result(self, rng: random.Random, criteria: List[str]) -> dict:
+        return {
+            "candidate": f"Candidate {rng.randrange(100000)}",
+            "scores": self.fake_scores(rng, criteria),
+            "summary": " ".join(fake_sentence(rng, 15) for _ in range(8))
+        }
+
+    async def generate_response(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        digest = message_digest(messages)
+        rng = random.Random(digest)
+        criteria = scoring_criteria(messages)
+        filenames = CV_FILE_HEADER.findall(messages[-1]["content"])
+        if filenames:
+            response = [{"filename": filename, **self.fake_result(rng, criteria)} for filename in filenames]
+        else:
+            response = self.fake_result(rng, criteria)
+        return await self.run(self.model_name, messages, digest, self.text_latency, json.dumps(response))
+
+    async def generate_json(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = "response", **kwargs) -> str:
+        digest = message_digest(messages)
+        rng = random.Random(digest)
+        properties = schema["properties"]
+        criteria = list(properties["scores"]["properties"])
+        if "candidate" in properties:
+            response = self.fake_result(rng, criteria)
+        else:
+            response = {"scores": self.fake_scores(rng, criteria)}
+        return await self.run(self.model_name, messages, digest, self.text_latency, json.dumps(response))
+
+    async def generate_vision(self, messages: List[Dict[str, Any]], **kwargs) -> str:
+        digest = message_digest(messages)
+        rng = random.Random(digest)
+        sections = [f"# Candidate {rng.randrange(100000)}"]
+        for heading in ("Experience", "Education", "Skills"):
+            sections.append(f"## {heading}")
+            sections.extend(f"- {fake_sentence(rng, 14)}" for _ in range(6))
+        return await self.run(self.vision_model_name, messages, digest, self.vision_latency, "\n\n".join(sections))
+
+    def latency_stats(self) -> Dict[str, Any]:
+        """Number of requests sent, rate limited and failed (shown by /llm-stats)"""
+        return dict(self.counts)
@@ -0,0 +1,100 @@
+"""
+Synthetic multi-page CV PDFs for benchmarks.
+
+Text CVs have an embedded text layer and take the text layer fast path; scanned CVs are
+drawn as page images without a text layer, so every page is rasterized and sent to vision OCR.
+Every CV is different (no two share a cache key) and the same index always gives the same PDF.
+
+Write a set of CVs to a directory, from the backend directory:
+    python -m benchmarks.synthetic_cvs OUTPUT_DIR [COUNT] [PAGES]
+"""
+import io
+import os
+import random
+import sys
+from typing import List
+from PIL import Image, ImageDraw
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+LINE_HEIGHT = 14
+FONT_SIZE = 10
+# Resolution of the page images of scanned CVs
+SCAN_DPI = 100
+WORDS = (
+    "led designed delivered migrated scaled mentored automated reduced improved built "
+    "python java kubernetes postgres kafka react aws terraform analytics platform team "
+    "customers pipeline latency revenue reliability compliance roadmap stakeholders"
+).split()
+SECTIONS = ["Experience", "Projects", "Education", "Skills", "Certifications", "Publications"]
+
+def cv_lines(index: int, pages: int) -> List[List[str]]:
+    """Text of each page of a CV: a repeated header, a few sections of bullet points and a page footer"""
+    rng = random.Random(index)
+    lines_per_page = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT - 4
+    name = f"Candidate {index}"
+    page_lines = []
+    for page in range(pages):
+        lines = [f"{name} - candidate{index}@example.com - +1 555 {index:07d}", ""]
+        while len(lines) < lines_per_page:
+            lines.append(rng.choice(SECTIONS))
+            for _ in range(rng.randint(3, 8)):
+                lines.append("- " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 14))))
+            lines.append("")
+        lines = lines[:lines_per_page]
+        lines.append(f"Page {page + 1} of {pages}")
+        page_lines.append(lines)
+    return page_lines
+
+def draw_scanned_page(lines: List[str]) -> Image.Image:
+    """Page image of the given lines, as a scanner would produce it"""
+    scale = SCAN_DPI / 72
+    image = Image.new("L", (int(PAGE_WIDTH * scale), int(PAGE_HEIGHT * scale)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((MARGIN * scale, (MARGIN + i * LINE_HEIGHT) * scale), line, fill=0)
+    return image
+
+def make_cv_pdf(index: int, pages: int = 2, scanned: bool = False) -> bytes:
+    """PDF bytes of the synthetic CV with the given index"""
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=(PAGE_WIDTH, PAGE_HEIGHT))
+    for lines in cv_lines(index, pages):
+        if scanned:
+            p.drawImage(ImageReader(draw_scanned_page(lines)), 0, 0, PAGE_WIDTH, PAGE_HEIGHT)
+        else:
+            p.setFont("Helvetica", FONT_SIZE)
+            for i, line in enumerate(lines):
+                p.drawString(MARGIN, PAGE_HEIGHT - MARGIN - i * LINE_HEIGHT, line)
+        p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+def make_cv_pdfs(count: int, pages: int = 2, scanned_share: float = 0.5, offset: int = 0) -> List[dict]:
+    """
+    `count` CVs as { "filename": ..., "data": <PDF bytes>, "scanned": ... }.
+    Scanned CVs are spread evenly so any prefix has about `scanned_share` of them.
+    """
+    cvs = []
+    for i in range(count):
+        index = offset + i
+        scanned = int((i + 1) * scanned_share) > int(i * scanned_share)
+        cvs.append({
+            "filename": f"cv_{index}.pdf",
+            "data": make_cv_pdf(index, pages, scanned),
+            "scanned": scanned
+        })
+    return cvs
+
+if __name__ == "__main__":
+    output_dir = sys.argv[1]
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    pages = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    os.makedirs(output_dir, exist_ok=True)
+    for cv in make_cv_pdfs(count, pages):
+        with open(os.path.join(output_dir, cv["filename"]), "wb") as f:
+            f.write(cv["data"])
+    print(f"Wrote {count} CVs of {pages} pages to {output_dir}")
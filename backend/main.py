@@ -1,20 +1,48 @@
 import os
+import asyncio
 import logging
+import time
+import uuid
 from datetime import datetime
 import json
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, UploadFile, Form, File, Depends, Request
-from typing import List, Annotated
-from fastapi.middleware.cors import CORSMiddleware
-from services.llm_service import get_llm_service
+from fastapi import FastAPI, HTTPException, UploadFile, Form, File, Depends, Request, Query
+from typing import List, Annotated, Optional
+from services.llm_service import get_llm_service, close_llm_services
 from services.ocr_services import OCRService
-from pydantic import BaseModel
-from database import engine, SessionLocal, create_default_rows
-from sqlalchemy.orm import Session
-from models import Base, Criterion, JobAnalysis, CVAnalysis, CVScore, JobAnalysisCriterion
+from services.rasterizer import shutdown_executor
+from services.reports import iter_report, open_report, report_etag
+from services.profiling import TIMING_PROFILE_ENABLED, AnalysisProfile
+from services.metrics import CONTENT_TYPE_LATEST, DB_WRITE_SECONDS, HTTP_REQUEST_SECONDS, METRICS_AVAILABLE, render_metrics
+from services.analysis import (
+    JOB_ANALYSES_MAX_PAGE_SIZE,
+    JOB_ANALYSES_PAGE_SIZE,
+    analyze_files,
+    compute_weighted_total,
+    create_job_analysis,
+    fetch_candidates,
+    fetch_job_analyses,
+    format_result,
+    save_results,
+)
+from services.jobs import (
+    enqueue_analysis,
+    fail_orphaned_jobs,
+    get_job_queue,
+    initial_progress,
+    read_uploads,
+    start_job_workers,
+    stop_job_workers,
+    take_lease,
+    to_upload_file,
+)
+from database import SessionLocal, create_default_rows, init_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Base, Criterion, JobAnalysis
 from schemas import CriterionCreate, CriterionOut
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from services.generatePDF import create_candidates_pdf
 import traceback
 
@@ -44,61 +72,51 @@ except Exception as e:
 app = FastAPI()
 logger.info("FastAPI application initialized")
 
-Base.metadata.create_all(bind=engine)
-create_default_rows()
-logger.info("Created db tables")
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started_at = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than path so ids do not create a series per request
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(time.perf_counter() - started_at)
+    return response
+
+@app.on_event("startup")
+async def startup():
+    await init_db(Base.metadata)
+    await create_default_rows()
+    logger.info("Created db tables")
+    await fail_orphaned_jobs()
+    start_job_workers()
 
-def get_db():
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_job_workers()
+    logger.info("Job workers stopped")
+    await close_llm_services()
+    logger.info("LLM service connections closed")
+    shutdown_executor()
+    logger.info("Rasterization process pool shut down")
+
+async def get_db():
     logger.info("Creating new database session")
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
         logger.info("Closing database session")
-        db.close()
-
-def to_pascal_case(name: str) -> str:
-    """
-    Convert a string to Pascal case, handling all types of input casing.
-    Examples: 
-    - "john doe" -> "John Doe"
-    - "JOHN DOE" -> "John Doe"
-    - "jOhN dOe" -> "John Doe"
-    - "John Doe" -> "John Doe"
-    """
-    if not name or name == "N/A":
-        return name
-    return " ".join(word.capitalize() for word in name.lower().split())
-
-db_dependency = Annotated[Session, Depends(get_db)]
 
-def compute_weighted_total(scores, parsed_criteria):
-    """
-    Compute the weighted total score (0-10 scale) given a dictionary of scores and the criteria with weights.
-    """
-    if not scores or not parsed_criteria:
-        return 0.0
-        
-    # Create a mapping of criterion names to weights
-    name_to_weight = {c["name"]: float(c["weight"]) for c in parsed_criteria}
-    
-    # Calculate weighted sum and total weight in one pass
-    weighted_sum = sum(
-        float(score_data["score"]) * name_to_weight.get(criterion_name, 0.0)
-        for criterion_name, score_data in scores.items()
-    )
-    total_weight = sum(name_to_weight.get(name, 0.0) for name in scores.keys())
-    
-    # Calculate final score
-    total_score = weighted_sum / total_weight if total_weight > 0 else 0.0
-    return min(round(total_score, 1), 10.0)
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 @app.post("/analyze-cvs")
 async def analyze_cvs(
     files: List[UploadFile] = File(...),
     criteria: str = Form(...),
     prompt: str = Form(None),
-    db: Session = Depends(get_db)
+    use_cache: bool = Form(True),
+    batch_scoring: Optional[bool] = Form(None),
+    background: bool = Form(False),
+    db: AsyncSession = Depends(get_db)
 ):
     try:
         # Parse and validate input
@@ -106,101 +124,243 @@ async def analyze_cvs(
         parsed_prompt = json.loads(prompt)
         logger.info(f"Processing {len(files)} files with {len(parsed_criteria)} criteria")
 
-        # Create JobAnalysis
-        job_analysis = JobAnalysis(prompt=parsed_prompt["job_description"])
-        db.add(job_analysis)
-        db.flush()
-
-        # Create JobAnalysisCriterion records
-        job_analysis_criteria_map = {
-            c["id"]: JobAnalysisCriterion(
-                job_analysis_id=job_analysis.id,
-                criterion_id=c["id"],
-                weight=c["weight"]
+        if background:
+            if get_job_queue().full():
+                raise HTTPException(status_code=503, detail="Too many analyses queued, please retry later")
+            uploads = await read_uploads(files)
+
+            # Persist the job first so its status can be polled right away
+            job_analysis, _ = await create_job_analysis(
+                db, parsed_criteria, parsed_prompt["job_description"], status="pending"
             )
-            for c in parsed_criteria
-        }
-        db.add_all(job_analysis_criteria_map.values())
-        db.flush()
-
-        # Process CVs
-        ocr_service = OCRService()
-        cv_contents = []
-        for file in files:
-            parsed_content = await ocr_service.parse_document(file)
-            cv_contents.append({
-                "filename": file.filename,
-                "content": parsed_content.get("markdown_content", "")
+            job_analysis.progress = initial_progress(uploads)
+            take_lease(job_analysis)
+            await db.commit()
+
+            try:
+                enqueue_analysis(
+                    job_analysis.id, uploads, parsed_criteria, parsed_prompt["job_description"], use_cache, batch_scoring
+                )
+            except asyncio.QueueFull:
+                # The queue filled up while the job was being saved; nothing would ever process it
+                job_analysis.status = "failed"
+                job_analysis.error = "Too many analyses queued"
+                await db.commit()
+                raise HTTPException(status_code=503, detail="Too many analyses queued, please retry later")
+            return JSONResponse(status_code=202, content={
+                "status": "accepted",
+                "job_analysis_id": str(job_analysis.id)
             })
 
-        # Get results from OCR service
-        results = await ocr_service.analyze_cvs(
-            cv_contents,
+        # OCR and score the CVs before touching the database, so no connection is held meanwhile
+        profile = AnalysisProfile() if TIMING_PROFILE_ENABLED else None
+        results = await analyze_files(
+            OCRService(),
+            files,
             parsed_criteria,
-            parsed_prompt["job_description"]
+            parsed_prompt["job_description"],
+            use_cache=use_cache,
+            batch_scoring=batch_scoring,
+            profile=profile
         )
 
-        # Process and save results
-        formatted_results = []
-        for result in results:
-            # Create CVAnalysis
-            cv_analysis = CVAnalysis(
-                job_analysis_id=job_analysis.id,
-                filename=result["filename"],
-                candidate_name=to_pascal_case(result.get("candidate", "Unknown")),
-                summary=result.get("summary", ""),
-                total_score=compute_weighted_total(result.get("scores", {}), parsed_criteria)
+        with DB_WRITE_SECONDS.time():
+            started_at = time.perf_counter()
+            # Create JobAnalysis and JobAnalysisCriterion records
+            job_analysis, job_analysis_criteria_map = await create_job_analysis(
+                db, parsed_criteria, parsed_prompt["job_description"]
             )
-            db.add(cv_analysis)
-            db.flush()
-
-            # Create CVScores
-            scores = []
-            for criterion in parsed_criteria:
-                score_data = result["scores"].get(criterion["name"], {})
-                if score_data:
-                    scores.append(CVScore(
-                        cv_analysis_id=cv_analysis.id,
-                        job_analysis_criterion_id=job_analysis_criteria_map[criterion["id"]].id,
-                        score=round(float(score_data["score"]), 1),
-                        explanation=score_data.get("explanation", "")
-                    ))
-            db.add_all(scores)
-
-            # Format result for response
-            formatted_results.append({
-                "filename": result["filename"],
-                "candidate": result.get("candidate", "Unknown"),
-                "summary": result.get("summary", ""),
-                "scores": [
-                    {
-                        "criterion_name": criterion["name"],
-                        "score": round(float(result["scores"][criterion["name"]]["score"]), 1),
-                        "explanation": result["scores"][criterion["name"]].get("explanation", "")
-                    }
-                    for criterion in parsed_criteria
-                    if criterion["name"] in result["scores"]
-                ]
-            })
 
-        db.commit()
+            # Process and save results
+            formatted_results = await save_results(db, job_analysis, job_analysis_criteria_map, parsed_criteria, results)
+
+            if profile:
+                profile.db_seconds += time.perf_counter() - started_at
+                job_analysis.timing_profile = profile.to_dict()
+            await db.commit()
         return {
             "status": "success",
             "results": formatted_results,
             "job_analysis_id": str(job_analysis.id)
         }
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error analyzing CVs: {str(e)}")
         logger.error(f"Error type: {type(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Error analyzing CVs: {str(e)}")
 
+def sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/analyze-cvs/stream")
+async def analyze_cvs_stream(
+    files: List[UploadFile] = File(...),
+    criteria: str = Form(...),
+    prompt: str = Form(None),
+    use_cache: bool = Form(True),
+    batch_scoring: Optional[bool] = Form(None)
+):
+    """
+    Same analysis as /analyze-cvs, streamed as Server-Sent Events:
+    a "parsed" event per CV once its OCR is done, a "scored" event per CV once its scores are computed,
+    and a final "ranking" event after the results are saved (or an "error" event).
+    """
+    try:
+        parsed_criteria = json.loads(criteria)
+        parsed_prompt = json.loads(prompt)
+        # The uploads are closed once the handler returns, before the stream has been consumed
+        uploads = await read_uploads(files)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid analysis request: {str(e)}")
+    logger.info(f"Streaming analysis of {len(uploads)} files with {len(parsed_criteria)} criteria")
+
+    async def event_stream():
+        queue: asyncio.Queue = asyncio.Queue()
+        task = None
+        # The id is assigned up front; the rows are only written once all CVs are scored
+        job_analysis_id = uuid.uuid4()
+        profile = AnalysisProfile() if TIMING_PROFILE_ENABLED else None
+        db = SessionLocal()
+        try:
+            yield sse_event("started", {
+                "job_analysis_id": str(job_analysis_id),
+                "total": len(uploads)
+            })
+
+            async def on_event(event: str, index: int, data: dict) -> None:
+                if event == "parsed":
+                    await queue.put(sse_event("parsed", {"index": index, **data}))
+                elif event == "scored":
+                    await queue.put(sse_event("scored", {
+                        "index": index,
+                        "error": data.get("error"),
+                        "total_score": compute_weighted_total(data.get("scores", {}), parsed_criteria),
+                        "result": format_result(data, parsed_criteria)
+                    }))
+
+            async def run():
+                try:
+                    return await analyze_files(
+                        OCRService(),
+                        [to_upload_file(upload) for upload in uploads],
+                        parsed_criteria,
+                        parsed_prompt["job_description"],
+                        use_cache=use_cache,
+                        on_event=on_event,
+                        batch_scoring=batch_scoring,
+                        profile=profile
+                    )
+                finally:
+                    await queue.put(None)  # end of the per-CV events
+
+            task = asyncio.ensure_future(run())
+            while (message := await queue.get()) is not None:
+                yield message
+            results = await task
+
+            with DB_WRITE_SECONDS.time():
+                started_at = time.perf_counter()
+                job_analysis, job_analysis_criteria_map = await create_job_analysis(
+                    db, parsed_criteria, parsed_prompt["job_description"], job_analysis_id=job_analysis_id
+                )
+                formatted_results = await save_results(db, job_analysis, job_analysis_criteria_map, parsed_criteria, results)
+                if profile:
+                    profile.db_seconds += time.perf_counter() - started_at
+                    job_analysis.timing_profile = profile.to_dict()
+                await db.commit()
+
+            ranking = sorted(
+                (
+                    {**formatted, "total_score": compute_weighted_total(result.get("scores", {}), parsed_criteria)}
+                    for formatted, result in zip(formatted_results, results)
+                ),
+                key=lambda candidate: candidate["total_score"],
+                reverse=True
+            )
+            yield sse_event("ranking", {
+                "status": "success",
+                "job_analysis_id": str(job_analysis.id),
+                "results": [{"rank": rank, **candidate} for rank, candidate in enumerate(ranking, start=1)]
+            })
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error streaming CV analysis: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            yield sse_event("error", {"detail": f"Error analyzing CVs: {str(e)}"})
+        finally:
+            # The client may disconnect mid-stream; stop the remaining work
+            if task and not task.done():
+                task.cancel()
+            await db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # let nginx pass events through unbuffered
+        }
+    )
+
+@app.get("/job-analyses/{job_analysis_id}/status")
+async def get_job_analysis_status(job_analysis_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    try:
+        job_analysis = (await db.execute(
+            select(JobAnalysis).where(JobAnalysis.id == job_analysis_id)
+        )).scalar_one_or_none()
+        if not job_analysis:
+            raise HTTPException(status_code=404, detail=f"Job analysis with id {job_analysis_id} not found")
+        progress = job_analysis.progress or []
+        return {
+            "status": "success",
+            "job_analysis_id": str(job_analysis.id),
+            "job_status": job_analysis.status,
+            "error": job_analysis.error,
+            "total": len(progress),
+            "completed": sum(1 for entry in progress if entry["status"] == "completed"),
+            "failed": sum(1 for entry in progress if entry["status"] == "failed"),
+            "progress": progress
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving job analysis status: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/job-analyses/{job_analysis_id}/profile")
+async def get_job_analysis_profile(job_analysis_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    """Debug view of the timing profile recorded for an analysis"""
+    try:
+        row = (await db.execute(
+            select(JobAnalysis.status, JobAnalysis.timing_profile).where(JobAnalysis.id == job_analysis_id)
+        )).one_or_none()
+        if not row:
+            raise HTTPException(status_code=404, detail=f"Job analysis with id {job_analysis_id} not found")
+        job_status, timing_profile = row
+        if timing_profile is None:
+            raise HTTPException(status_code=404, detail=f"No timing profile recorded for job analysis {job_analysis_id}")
+        return {
+            "status": "success",
+            "job_analysis_id": str(job_analysis_id),
+            "job_status": job_status,
+            "timing_profile": timing_profile
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving job analysis profile: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/criteria/{criterion_id}")
-async def get_criterion(criterion_id: int, db: Session = Depends(get_db)):
+async def get_criterion(criterion_id: int, db: AsyncSession = Depends(get_db)):
     try:
-        criterion = db.query(Criterion).filter(Criterion.id == criterion_id).first()
+        criterion = await db.get(Criterion, criterion_id)
         if not criterion:
             raise HTTPException(status_code=404, detail=f"Criterion with id {criterion_id} not found")
         return criterion
@@ -209,47 +369,18 @@ async def get_criterion(criterion_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/results/{job_analysis_id}")
-async def get_results(job_analysis_id: str, db: Session = Depends(get_db)):
+async def get_results(job_analysis_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
     try:
-        # Fetch all CVAnalysis for this job_analysis_id, ordered by total_score descending
-        cv_analyses = (
-            db.query(CVAnalysis)
-            .filter(CVAnalysis.job_analysis_id == job_analysis_id)
-            .order_by(CVAnalysis.total_score.desc())
-            .all()
-        )
-        candidates = []
-        for idx, cv in enumerate(cv_analyses):
-            # Fetch all CVScore for this CVAnalysis
-            scores = db.query(CVScore).filter(CVScore.cv_analysis_id == cv.id).all()
-            # For each score, get the criterion name
-            score_list = []
-            for score in scores:
-                # Join to get criterion name
-                job_analysis_criterion = db.query(JobAnalysisCriterion).filter(JobAnalysisCriterion.id == score.job_analysis_criterion_id).first()
-                criterion = db.query(Criterion).filter(Criterion.id == job_analysis_criterion.criterion_id).first() if job_analysis_criterion else None
-                score_list.append({
-                    "criterion": criterion.name if criterion else "Unknown",
-                    "score": round(score.score, 1),
-                    "explanation": score.explanation if score.explanation else ""
-                })
-            candidates.append({
-                "index": idx + 1,  # 1-based index for rank
-                "filename": cv.filename,
-                "candidate_name": cv.candidate_name,
-                "summary": cv.summary,
-                "total_score": round(cv.total_score, 1) if cv.total_score is not None else None,
-                "scores": score_list
-            })
+        candidates = await fetch_candidates(db, job_analysis_id)
         return {"candidates": candidates}
     except Exception as e:
         logger.error(f"Error retrieving results: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving results: {str(e)}")
 
 @app.get("/criteria")
-async def get_all_criteria(db: Session = Depends(get_db)):
+async def get_all_criteria(db: AsyncSession = Depends(get_db)):
     try:
-        criteria = db.query(Criterion).all()
+        criteria = (await db.execute(select(Criterion))).scalars().all()
         return {
             "status": "success",
             "criteria": [
@@ -265,25 +396,27 @@ async def get_all_criteria(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/criteria", response_model=CriterionOut)
-async def create_criterion(criterion: CriterionCreate, db: Session = Depends(get_db)):
+async def create_criterion(criterion: CriterionCreate, db: AsyncSession = Depends(get_db)):
     # Check for duplicate name
-    existing = db.query(Criterion).filter(Criterion.name == criterion.name).first()
+    existing = (await db.execute(
+        select(Criterion).where(Criterion.name == criterion.name)
+    )).scalars().first()
     if existing:
         raise HTTPException(status_code=400, detail="Criterion with this name already exists.")
     new_criterion = Criterion(name=criterion.name, description=criterion.description)
     db.add(new_criterion)
-    db.commit()
-    db.refresh(new_criterion)
+    await db.commit()
+    await db.refresh(new_criterion)
     return new_criterion
 
 @app.post("/generate-pdf")
 async def generate_pdf(request: Request):
     data = await request.json()
     candidates = data.get("candidates", [])
-    print("Received candidates data:", candidates)
+    logger.info(f"Generating PDF report for {len(candidates)} candidates")
 
-    # Generate PDF
-    pdf_buffer = create_candidates_pdf(candidates)
+    # Generate PDF off the event loop
+    pdf_buffer = await asyncio.to_thread(create_candidates_pdf, candidates)
 
     return StreamingResponse(
         pdf_buffer,
@@ -291,25 +424,81 @@ async def generate_pdf(request: Request):
         headers={"Content-Disposition": "attachment; filename=report.pdf"}
     )
 
+@app.get("/job-analyses/{job_analysis_id}/report")
+async def get_job_analysis_report(job_analysis_id: uuid.UUID, request: Request, db: AsyncSession = Depends(get_db)):
+    try:
+        job_analysis = (await db.execute(
+            select(JobAnalysis.status, JobAnalysis.created_at).where(JobAnalysis.id == job_analysis_id)
+        )).one_or_none()
+        if not job_analysis:
+            raise HTTPException(status_code=404, detail=f"Job analysis with id {job_analysis_id} not found")
+        if job_analysis.status != "completed":
+            raise HTTPException(status_code=409, detail=f"Job analysis is {job_analysis.status}, the report is available once it has completed")
+
+        etag = report_etag(job_analysis_id)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        report = await open_report(
+            job_analysis_id,
+            lambda: fetch_candidates(db, job_analysis_id),
+            generated_at=job_analysis.created_at
+        )
+        headers["Content-Length"] = str(os.fstat(report.fileno()).st_size)
+        headers["Content-Disposition"] = f"attachment; filename=report-{job_analysis_id}.pdf"
+        return StreamingResponse(iter_report(report), media_type="application/pdf", headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating report: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
+
 @app.get("/job-analyses")
-async def get_job_analyses(db: Session = Depends(get_db)):
+async def get_job_analyses(
+    limit: int = Query(JOB_ANALYSES_PAGE_SIZE, ge=1, le=JOB_ANALYSES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    search: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
     try:
-        # Fetch all job analyses ordered by creation date (newest first)
-        job_analyses = (
-            db.query(JobAnalysis)
-            .order_by(JobAnalysis.created_at.desc())
-            .all()
+        # Fetch one page of job analyses ordered by creation date (newest first)
+        job_analyses, next_cursor = await fetch_job_analyses(
+            db,
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            search=search,
+            created_from=created_from,
+            created_to=created_to
         )
-        
         return {
             "status": "success",
-            "job_analyses": [
-                {
-                    "id": str(analysis.id),  # Convert UUID to string
-                    "created_at": analysis.created_at.isoformat()
-                } for analysis in job_analyses
-            ]
+            "job_analyses": job_analyses,
+            "next_cursor": next_cursor
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving job analyses: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/llm-stats")
+async def get_llm_stats():
+    """Per-provider latency percentiles, error, hedge and failover counts of the LLM service"""
+    return {
+        "status": "success",
+        "provider": llm_service.provider,
+        "model": llm_service.model_name,
+        "latency": llm_service.latency_stats()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics in the text exposition format"""
+    if not METRICS_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Metrics are unavailable, install prometheus_client to enable them")
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Text, Float, ForeignKey, DateTime, Integer
+from sqlalchemy import Column, String, Text, Float, ForeignKey, DateTime, Integer, JSON, Index
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.orm import relationship, declarative_base, deferred
 from datetime import datetime, UTC
 import uuid
 
@@ -22,7 +22,24 @@ class JobAnalysis(Base):
     __tablename__ = 'job_analyses'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     prompt = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+    # Naive UTC: the column has no time zone and asyncpg rejects aware datetimes for it
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC).replace(tzinfo=None))
+    # pending -> processing -> completed | failed; analyses run inline are created as completed
+    status = Column(String, nullable=False, default="completed", server_default="completed")
+    # Per-CV progress of background analyses: [{ "filename": ..., "status": ..., "error": ... }]
+    progress = Column(JSON)
+    error = Column(Text)
+    # Server process running a background analysis, and when it last confirmed it is still alive.
+    # Analyses whose heartbeat stops are failed by the other processes (see services.jobs)
+    worker_id = Column(String)
+    heartbeat_at = Column(DateTime)
+    # Timing trace of the analysis (see services.profiling.AnalysisProfile), for debugging slow analyses.
+    # Deferred so polling the status does not load it
+    timing_profile = deferred(Column(JSON))
+    __table_args__ = (
+        # Keyset pagination of the analysis history orders by (created_at, id)
+        Index("ix_job_analyses_created_at_id", "created_at", "id"),
+    )
     criteria = relationship(
         "JobAnalysisCriterion",
         back_populates="job_analysis",
@@ -39,7 +56,7 @@ class JobAnalysis(Base):
 class JobAnalysisCriterion(Base):
     __tablename__ = 'job_analysis_criteria'
     id = Column(Integer, primary_key=True, index=True)
-    job_analysis_id = Column(UUID(as_uuid=True), ForeignKey('job_analyses.id', ondelete="CASCADE"))
+    job_analysis_id = Column(UUID(as_uuid=True), ForeignKey('job_analyses.id', ondelete="CASCADE"), index=True)
     criterion_id = Column(Integer, ForeignKey('criteria.id', ondelete="CASCADE"))
     weight = Column(Float, nullable=False)
     job_analysis = relationship(
@@ -62,7 +79,7 @@ class JobAnalysisCriterion(Base):
 class CVAnalysis(Base):
     __tablename__ = 'cv_analyses'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    job_analysis_id = Column(UUID(as_uuid=True), ForeignKey('job_analyses.id', ondelete="CASCADE"))
+    job_analysis_id = Column(UUID(as_uuid=True), ForeignKey('job_analyses.id', ondelete="CASCADE"), index=True)
     filename = Column(String, nullable=False)
     candidate_name = Column(String, nullable=False)
     summary = Column(Text)
@@ -82,7 +99,7 @@ class CVAnalysis(Base):
 class CVScore(Base):
     __tablename__ = 'cv_scores'
     id = Column(Integer, primary_key=True, index=True)
-    cv_analysis_id = Column(UUID(as_uuid=True), ForeignKey('cv_analyses.id', ondelete="CASCADE"))
+    cv_analysis_id = Column(UUID(as_uuid=True), ForeignKey('cv_analyses.id', ondelete="CASCADE"), index=True)
     job_analysis_criterion_id = Column(Integer, ForeignKey('job_analysis_criteria.id', ondelete="CASCADE"))
     score = Column(Float, nullable=False)
     explanation = Column(Text)
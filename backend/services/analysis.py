@@ -0,0 +1,396 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import UploadFile
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Criterion, JobAnalysis, JobAnalysisCriterion, CVAnalysis, CVScore
+from .batch_scoring import BATCH_SCORING_ENABLED, BATCH_SCORING_MAX_CV_TOKENS, ScoringBatcher
+from .bulk_insert import bulk_insert
+from .compaction import compact_cv
+from .metrics import SCORING_CV_SECONDS
+from .ocr_services import OCRService, SCORING_CONCURRENCY
+from .profiling import AnalysisProfile, current_trace, tracing
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of documents of a single analysis that are OCR'd at the same time
+ANALYSIS_DOCUMENT_CONCURRENCY = int(os.getenv("ANALYSIS_DOCUMENT_CONCURRENCY", "8"))
+
+# Page size limits of the analysis history
+JOB_ANALYSES_PAGE_SIZE = int(os.getenv("JOB_ANALYSES_PAGE_SIZE", "50"))
+JOB_ANALYSES_MAX_PAGE_SIZE = int(os.getenv("JOB_ANALYSES_MAX_PAGE_SIZE", "200"))
+PROMPT_SNIPPET_LENGTH = 120
+
+# Called as each CV moves through the pipeline: on_event(event, index, data)
+# with event "parsed" once its OCR finished and "scored" once its scores are computed
+EventCallback = Callable[[str, int, dict], Awaitable[None]]
+
+def to_pascal_case(name: str) -> str:
+    """
+    Convert a string to Pascal case, handling all types of input casing.
+    Examples: 
+    - "john doe" -> "John Doe"
+    - "JOHN DOE" -> "John Doe"
+    - "jOhN dOe" -> "John Doe"
+    - "John Doe" -> "John Doe"
+    """
+    if not name or name == "N/A":
+        return name
+    return " ".join(word.capitalize() for word in name.lower().split())
+
+def compute_weighted_total(scores, parsed_criteria):
+    """
+    Compute the weighted total score (0-10 scale) given a dictionary of scores and the criteria with weights.
+    """
+    if not scores or not parsed_criteria:
+        return 0.0
+        
+    # Create a mapping of criterion names to weights
+    name_to_weight = {c["name"]: float(c["weight"]) for c in parsed_criteria}
+    
+    # Calculate weighted sum and total weight in one pass
+    weighted_sum = sum(
+        float(score_data["score"]) * name_to_weight.get(criterion_name, 0.0)
+        for criterion_name, score_data in scores.items()
+    )
+    total_weight = sum(name_to_weight.get(name, 0.0) for name in scores.keys())
+    
+    # Calculate final score
+    total_score = weighted_sum / total_weight if total_weight > 0 else 0.0
+    return min(round(total_score, 1), 10.0)
+
+async def create_job_analysis(
+    db: AsyncSession,
+    parsed_criteria: List[dict],
+    job_description: str,
+    status: str = "completed",
+    job_analysis_id: Optional[uuid.UUID] = None
+) -> Tuple[JobAnalysis, Dict[int, JobAnalysisCriterion]]:
+    """Create the JobAnalysis and its JobAnalysisCriterion rows; returns the criteria keyed by criterion id"""
+    job_analysis = JobAnalysis(id=job_analysis_id or uuid.uuid4(), prompt=job_description, status=status)
+    db.add(job_analysis)
+    await db.flush()
+
+    job_analysis_criteria_map = {
+        c["id"]: JobAnalysisCriterion(
+            job_analysis_id=job_analysis.id,
+            criterion_id=c["id"],
+            weight=c["weight"]
+        )
+        for c in parsed_criteria
+    }
+    db.add_all(job_analysis_criteria_map.values())
+    await db.flush()
+    return job_analysis, job_analysis_criteria_map
+
+async def analyze_files(
+    ocr_service: OCRService,
+    files: List[UploadFile],
+    parsed_criteria: List[dict],
+    job_description: str,
+    use_cache: bool = True,
+    on_event: Optional[EventCallback] = None,
+    batch_scoring: Optional[bool] = None,
+    profile: Optional[AnalysisProfile] = None
+) -> List[dict]:
+    """
+    OCR and score every file. Each CV moves on to scoring as soon as its own OCR is done,
+    so CVs do not wait for the whole upload to be parsed. Returns the results in input order.
+    With `batch_scoring` (default BATCH_SCORING_ENABLED), short CVs are scored several per LLM call.
+    With a `profile`, the timings of every file are recorded into it.
+    """
+    system_prompt = ocr_service.build_scoring_prompt(parsed_criteria, job_description)
+    document_semaphore = asyncio.Semaphore(ANALYSIS_DOCUMENT_CONCURRENCY)
+    scoring_semaphore = asyncio.Semaphore(SCORING_CONCURRENCY)
+
+    async def score_batch(cvs: List[dict]) -> List[dict]:
+        # Retries of a batched call belong to the batch, not to the file whose task happened to send it
+        with tracing(profile.batch([cv["filename"] for cv in cvs]) if profile else None) as trace:
+            started_at = time.perf_counter()
+            async with scoring_semaphore:
+                results = await ocr_service.score_cv_batch(cvs, parsed_criteria, job_description, system_prompt, use_cache)
+            if trace is not None:
+                trace["scoring_seconds"] = time.perf_counter() - started_at
+            return results
+
+    use_batches = BATCH_SCORING_ENABLED if batch_scoring is None else batch_scoring
+    batcher = ScoringBatcher(score_batch, expected=len(files)) if use_batches else None
+
+    async def process(index: int, file: UploadFile) -> dict:
+        with tracing(profile.file(index, file.filename) if profile else None):
+            return await process_file(index, file)
+
+    async def process_file(index: int, file: UploadFile) -> dict:
+        trace = current_trace()
+        queued_at = time.perf_counter()
+        async with document_semaphore:
+            started_at = time.perf_counter()
+            parsed_content = await ocr_service.parse_document(file)
+        if trace is not None:
+            trace["queued_seconds"] = started_at - queued_at
+            trace["parse_seconds"] = time.perf_counter() - started_at
+            trace["pages"] = len(parsed_content.get("pages") or []) + len(parsed_content.get("page_errors", []))
+            trace["text_layer_pages"] = parsed_content.get("text_layer_pages", 0)
+            trace["cached"] = bool(parsed_content.get("cached"))
+            trace["error"] = parsed_content.get("error")
+        for page_error in parsed_content.get("page_errors", []):
+            logger.warning(f"OCR failed for page {page_error['page']} of {file.filename}: {page_error['error']}")
+        for page_stats in parsed_content.get("preprocessing", []):
+            bytes_saved = f"{page_stats['bytes_saved']} bytes, " if page_stats["bytes_saved"] is not None else ""
+            logger.info(
+                f"Page {page_stats['page']} of {file.filename}: {page_stats['bytes']} bytes, "
+                f"~{page_stats['tokens']} image tokens (saved {bytes_saved}{page_stats['tokens_saved']} tokens)"
+            )
+        compaction = compact_cv(parsed_content.get("pages") or [parsed_content.get("markdown_content", "")])
+        logger.info(
+            f"Compacted {file.filename}: ~{compaction['original_tokens']} -> ~{compaction['tokens']} tokens "
+            f"(saved {compaction['tokens_saved']}{', truncated' if compaction['truncated'] else ''})"
+        )
+        cv = {
+            "filename": file.filename,
+            "content": compaction["content"]
+        }
+        if on_event:
+            await on_event("parsed", index, {
+                "filename": file.filename,
+                "error": parsed_content.get("error"),
+                "page_errors": parsed_content.get("page_errors", []),
+                "compaction": {key: value for key, value in compaction.items() if key != "content"}
+            })
+
+        started_at = time.perf_counter()
+        batched = bool(batcher) and compaction["tokens"] <= BATCH_SCORING_MAX_CV_TOKENS
+        with SCORING_CV_SECONDS.labels(ocr_service.llm_service.provider).time():
+            if batched:
+                result = await batcher.submit(cv, compaction["tokens"])
+            else:
+                if batcher:
+                    batcher.skip()
+                async with scoring_semaphore:
+                    result = await ocr_service.score_cv(cv, parsed_criteria, job_description, system_prompt, use_cache)
+        if trace is not None:
+            trace["scoring_seconds"] = time.perf_counter() - started_at
+            trace["batched"] = batched
+            trace["error"] = trace["error"] or result.get("error")
+        if on_event:
+            await on_event("scored", index, result)
+        return result
+
+    tasks = [asyncio.ensure_future(process(index, file)) for index, file in enumerate(files)]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        # Stop the other CVs before the caller handles the failure, so none of them is still
+        # reporting progress through `on_event` (e.g. committing on a shared session) afterwards
+        for task in tasks:
+            task.cancel()
+        if batcher:
+            batcher.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+def format_result(result: dict, parsed_criteria: List[dict]) -> dict:
+    """Shape of a single CV result as returned by the API"""
+    return {
+        "filename": result["filename"],
+        "candidate": result.get("candidate", "Unknown"),
+        "summary": result.get("summary", ""),
+        "scores": [
+            {
+                "criterion_name": criterion["name"],
+                "score": round(float(result["scores"][criterion["name"]]["score"]), 1),
+                "explanation": result["scores"][criterion["name"]].get("explanation", "")
+            }
+            for criterion in parsed_criteria
+            if criterion["name"] in result["scores"]
+        ]
+    }
+
+async def save_results(
+    db: AsyncSession,
+    job_analysis: JobAnalysis,
+    job_analysis_criteria_map: Dict[int, JobAnalysisCriterion],
+    parsed_criteria: List[dict],
+    results: List[dict]
+) -> List[dict]:
+    """
+    Insert the CVAnalysis and CVScore rows for the results; returns the formatted results.
+    CV ids are assigned here, so all rows are written with a few bulk statements instead of a flush per CV.
+    """
+    cv_rows = []
+    score_rows = []
+    formatted_results = []
+    for result in results:
+        cv_analysis_id = uuid.uuid4()
+        cv_rows.append({
+            "id": cv_analysis_id,
+            "job_analysis_id": job_analysis.id,
+            "filename": result["filename"],
+            "candidate_name": to_pascal_case(result.get("candidate", "Unknown")),
+            "summary": result.get("summary", ""),
+            "total_score": compute_weighted_total(result.get("scores", {}), parsed_criteria)
+        })
+
+        for criterion in parsed_criteria:
+            score_data = result["scores"].get(criterion["name"], {})
+            if score_data:
+                score_rows.append({
+                    "cv_analysis_id": cv_analysis_id,
+                    "job_analysis_criterion_id": job_analysis_criteria_map[criterion["id"]].id,
+                    "score": round(float(score_data["score"]), 1),
+                    "explanation": score_data.get("explanation", "")
+                })
+
+        # Format result for response
+        formatted_results.append(format_result(result, parsed_criteria))
+
+    await bulk_insert(db, CVAnalysis, cv_rows)
+    await bulk_insert(db, CVScore, score_rows)
+    return formatted_results
+
+async def fetch_candidates(db: AsyncSession, job_analysis_id) -> List[dict]:
+    """
+    Load the ranked candidates of a job analysis with their scores and criterion names.
+    Everything is read in a single joined query, ordered by total score.
+    """
+    rows = (await db.execute(
+        select(
+            CVAnalysis.id,
+            CVAnalysis.filename,
+            CVAnalysis.candidate_name,
+            CVAnalysis.summary,
+            CVAnalysis.total_score,
+            CVScore.score,
+            CVScore.explanation,
+            Criterion.name
+        )
+        .outerjoin(CVScore, CVScore.cv_analysis_id == CVAnalysis.id)
+        .outerjoin(JobAnalysisCriterion, JobAnalysisCriterion.id == CVScore.job_analysis_criterion_id)
+        .outerjoin(Criterion, Criterion.id == JobAnalysisCriterion.criterion_id)
+        .where(CVAnalysis.job_analysis_id == job_analysis_id)
+        .order_by(CVAnalysis.total_score.desc(), CVAnalysis.id, CVScore.id)
+    )).all()
+
+    # Rows come grouped by CV in ranking order; fold the score rows into their candidate
+    candidates = []
+    candidates_by_id = {}
+    for cv_id, filename, candidate_name, summary, total_score, score, explanation, criterion_name in rows:
+        candidate = candidates_by_id.get(cv_id)
+        if candidate is None:
+            candidate = {
+                "index": len(candidates) + 1,  # 1-based index for rank
+                "filename": filename,
+                "candidate_name": candidate_name,
+                "summary": summary,
+                "total_score": round(total_score, 1) if total_score is not None else None,
+                "scores": []
+            }
+            candidates_by_id[cv_id] = candidate
+            candidates.append(candidate)
+        if score is not None:
+            candidate["scores"].append({
+                "criterion": criterion_name if criterion_name else "Unknown",
+                "score": round(score, 1),
+                "explanation": explanation if explanation else ""
+            })
+    return candidates
+
+def to_naive_utc(value: datetime) -> datetime:
+    """created_at is stored as a naive UTC timestamp"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def encode_cursor(created_at: datetime, job_analysis_id) -> str:
+    """Opaque pagination cursor pointing at the last row of a page"""
+    payload = json.dumps([created_at.isoformat(), str(job_analysis_id)])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        created_at, job_analysis_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return to_naive_utc(datetime.fromisoformat(created_at)), uuid.UUID(job_analysis_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+async def fetch_job_analyses(
+    db: AsyncSession,
+    limit: int = JOB_ANALYSES_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    search: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of the analysis history, newest first, with per-analysis summary fields.
+    Pages are addressed by a (created_at, id) keyset cursor so every page costs the same.
+    Returns the rows and the cursor of the next page (None on the last page).
+    """
+    limit = max(1, min(limit, JOB_ANALYSES_MAX_PAGE_SIZE))
+
+    # Correlated subqueries are only evaluated for the rows of the page
+    cv_count = (
+        select(func.count(CVAnalysis.id))
+        .where(CVAnalysis.job_analysis_id == JobAnalysis.id)
+        .correlate(JobAnalysis)
+        .scalar_subquery()
+    )
+    top_score = (
+        select(func.max(CVAnalysis.total_score))
+        .where(CVAnalysis.job_analysis_id == JobAnalysis.id)
+        .correlate(JobAnalysis)
+        .scalar_subquery()
+    )
+    query = select(
+        JobAnalysis.id,
+        JobAnalysis.created_at,
+        JobAnalysis.status,
+        func.substr(JobAnalysis.prompt, 1, PROMPT_SNIPPET_LENGTH),
+        cv_count,
+        top_score
+    )
+
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(tuple_(JobAnalysis.created_at, JobAnalysis.id) < tuple_(cursor_created_at, cursor_id))
+    if status:
+        query = query.where(JobAnalysis.status == status)
+    if search:
+        # % and _ in the search text are matched literally
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.where(JobAnalysis.prompt.ilike(f"%{escaped}%", escape="\\"))
+    if created_from:
+        query = query.where(JobAnalysis.created_at >= to_naive_utc(created_from))
+    if created_to:
+        query = query.where(JobAnalysis.created_at < to_naive_utc(created_to))
+
+    # Fetch one extra row to know whether there is a next page
+    rows = (await db.execute(
+        query.order_by(JobAnalysis.created_at.desc(), JobAnalysis.id.desc())
+        .limit(limit + 1)
+    )).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    job_analyses = [
+        {
+            "id": str(job_analysis_id),  # Convert UUID to string
+            "created_at": created_at.isoformat(),
+            "status": job_status,
+            "prompt_snippet": snippet,
+            "cv_count": count,
+            "top_score": round(score, 1) if score is not None else None
+        }
+        for job_analysis_id, created_at, job_status, snippet, count, score in rows
+    ]
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+    return job_analyses, next_cursor
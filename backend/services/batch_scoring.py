@@ -0,0 +1,97 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+# Score several short CVs per LLM call so the shared system prompt is only sent once per batch
+BATCH_SCORING_ENABLED = os.getenv("BATCH_SCORING_ENABLED", "false").lower() == "true"
+# Only CVs up to this many (estimated) tokens are batched; longer CVs are scored on their own
+BATCH_SCORING_MAX_CV_TOKENS = int(os.getenv("BATCH_SCORING_MAX_CV_TOKENS", "1500"))
+# Maximum number of CV content tokens in a single batched prompt
+BATCH_SCORING_TOKEN_BUDGET = int(os.getenv("BATCH_SCORING_TOKEN_BUDGET", "6000"))
+# The response of a batch has to fit the model's output limit (scores, explanations and a summary per CV)
+BATCH_SCORING_MAX_OUTPUT_TOKENS = int(os.getenv("BATCH_SCORING_MAX_OUTPUT_TOKENS", "4000"))
+BATCH_SCORING_OUTPUT_TOKENS_PER_CV = int(os.getenv("BATCH_SCORING_OUTPUT_TOKENS_PER_CV", "800"))
+# Seconds a partial batch waits for more CVs to finish OCR before it is sent anyway
+BATCH_SCORING_MAX_WAIT = float(os.getenv("BATCH_SCORING_MAX_WAIT", "2.0"))
+
+ScoreBatch = Callable[[List[dict]], Awaitable[List[dict]]]
+
+def max_batch_size() -> int:
+    """Number of CVs whose results fit in one response"""
+    return max(1, BATCH_SCORING_MAX_OUTPUT_TOKENS // BATCH_SCORING_OUTPUT_TOKENS_PER_CV)
+
+class ScoringBatcher:
+    """
+    Collects CVs as their OCR finishes and scores them in batches.
+    A batch is sent once adding the next CV would exceed the token budget or the batch size,
+    once every expected CV has been submitted or skipped, or after BATCH_SCORING_MAX_WAIT seconds.
+    """
+
+    def __init__(self, score_batch: ScoreBatch, expected: int, token_budget: Optional[int] = None):
+        self.score_batch = score_batch
+        self.remaining = expected  # CVs that may still be submitted
+        self.token_budget = token_budget or BATCH_SCORING_TOKEN_BUDGET
+        self.max_size = max_batch_size()
+        self.pending: List[Tuple[dict, asyncio.Future]] = []
+        self.pending_tokens = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks = set()
+
+    async def submit(self, cv: dict, tokens: int) -> dict:
+        """Add a CV to the current batch and wait for its result"""
+        filenames = {pending_cv["filename"] for pending_cv, _ in self.pending}
+        # Results are matched by filename, so a batch never holds two CVs with the same name
+        if self.pending and (
+            self.pending_tokens + tokens > self.token_budget
+            or len(self.pending) >= self.max_size
+            or cv["filename"] in filenames
+        ):
+            self.flush()
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((cv, future))
+        self.pending_tokens += tokens
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(BATCH_SCORING_MAX_WAIT, self.flush)
+        return await future
+
+    def skip(self) -> None:
+        """Record that an expected CV is scored outside of the batches"""
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.flush()
+
+    def flush(self) -> None:
+        """Send the current batch"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        batch, self.pending, self.pending_tokens = self.pending, [], 0
+        task = asyncio.ensure_future(self.run(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def cancel(self) -> None:
+        """Drop the current batch and stop the batches being scored, when the analysis is abandoned"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.pending, self.pending_tokens = [], 0
+        for task in self.tasks:
+            task.cancel()
+
+    async def run(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        try:
+            results = await self.score_batch([cv for cv, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,29 @@
+import os
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Rows per INSERT statement when bulk inserting, and row count from which Postgres COPY is used instead
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "1000"))
+BULK_COPY_THRESHOLD = int(os.getenv("BULK_COPY_THRESHOLD", "5000"))
+
+async def bulk_insert(db: AsyncSession, model, rows: list) -> None:
+    """
+    Insert many rows (dicts of column values) for a model in as few round trips as possible:
+    batched multi-row INSERTs, or COPY for very large inserts on Postgres.
+    """
+    if not rows:
+        return
+    await db.flush()  # rows may reference objects that are still pending in the session
+    if len(rows) >= BULK_COPY_THRESHOLD and db.get_bind().dialect.name == "postgresql":
+        columns = list(rows[0].keys())
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        # asyncpg's binary COPY, inside the session's transaction
+        await raw_connection.driver_connection.copy_records_to_table(
+            model.__tablename__,
+            records=[tuple(row[column] for column in columns) for row in rows],
+            columns=columns
+        )
+        return
+    for start in range(0, len(rows), BULK_INSERT_BATCH_SIZE):
+        await db.execute(insert(model), rows[start:start + BULK_INSERT_BATCH_SIZE])
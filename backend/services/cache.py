@@ -0,0 +1,160 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Suffix of entries still being written; they are not part of the cache until moved into place
+TEMP_SUFFIX = ".tmp"
+# Temp files older than this were left behind by a crashed writer and are deleted on startup
+STALE_TEMP_SECONDS = 24 * 60 * 60
+
+def sha256_hex(data) -> str:
+    """SHA-256 hex digest of bytes or text"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+class DiskLRUCache:
+    """
+    Persistent key -> text cache stored as one file per entry on local disk.
+    Reads refresh an entry's mtime; once the total size exceeds `max_bytes`,
+    the least recently used entries are deleted.
+    Large binary entries can be written to `temp_path` and stored with `add_file`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, extension: str = ".md"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._remove_stale_temps()
+        self.total_bytes = sum(size for _, _, size in self._entries())
+
+    def _path(self, key: str) -> str:
+        # Keys are hex digests (optionally prefixed); shard by the first characters of the digest
+        digest = key.rsplit(":", 1)[-1]
+        return os.path.join(self.directory, digest[:2], f"{key.replace(':', '_')}{self.extension}")
+
+    def _files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                yield name, os.path.join(root, name)
+
+    def _entries(self):
+        for name, path in self._files():
+            # Temp files are being written outside the lock; they are not entries until `add_file` moves them
+            if name.endswith(TEMP_SUFFIX):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield path, stat.st_mtime, stat.st_size
+
+    def _remove_stale_temps(self) -> None:
+        """Delete temp files left behind by a process that stopped while writing them"""
+        cutoff = time.time() - STALE_TEMP_SECONDS
+        for name, path in self._files():
+            if not name.endswith(TEMP_SUFFIX):
+                continue
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = f.read()
+            os.utime(path)  # mark as recently used
+            return value
+        except FileNotFoundError:
+            return None
+
+    def get_path(self, key: str) -> Optional[str]:
+        """Path of a cached entry (marked as recently used), or None on a miss"""
+        path = self._path(key)
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            return None
+
+    def temp_path(self, key: str) -> str:
+        """A private file path to write an entry to before handing it to `add_file`"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{threading.get_ident()}{TEMP_SUFFIX}"
+
+    def add_file(self, key: str, temp_path: str) -> str:
+        """Move a fully written file into the cache; returns the entry's path"""
+        path = self._path(key)
+        with self.lock:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+            # The temp file's mtime is when writing started; the new entry must not look least recently used
+            os.utime(path)
+            self.total_bytes += size - previous_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def set(self, key: str, value: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = value.encode("utf-8")
+        temp_path = f"{path}.{threading.get_ident()}{TEMP_SUFFIX}"
+        with self.lock:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)  # atomic, readers never see partial entries
+            self.total_bytes += len(data) - previous_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the cache is back to 90% of its size limit"""
+        target_bytes = self.max_bytes * 0.9
+        for path, _, size in sorted(self._entries(), key=lambda entry: entry[1]):
+            if self.total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+                self.total_bytes -= size
+            except FileNotFoundError:
+                continue
+
+class TTLCache:
+    """
+    In-memory key -> value cache with a time to live and a maximum number of entries.
+    When full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
@@ -0,0 +1,139 @@
+import os
+import re
+from collections import Counter
+from typing import List, Optional
+
+# CV markdown is compacted before scoring to cut prompt tokens
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "true").lower() == "true"
+# Maximum number of (estimated) tokens of CV content sent to the scoring model
+CV_TOKEN_BUDGET = int(os.getenv("CV_TOKEN_BUDGET", "4000"))
+# Number of lines at the top and bottom of each page checked for repeated headers and footers
+HEADER_FOOTER_LINES = int(os.getenv("HEADER_FOOTER_LINES", "2"))
+# A line is a header/footer if it appears on at least this share of the pages (and on two or more)
+HEADER_FOOTER_MIN_PAGE_SHARE = float(os.getenv("HEADER_FOOTER_MIN_PAGE_SHARE", "0.5"))
+
+# Average characters per token of English text for OpenAI and Gemini tokenizers
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = "[... CV truncated ...]"
+
+TABLE_SEPARATOR_CELL = re.compile(r"^:?-{3,}:?$")
+INLINE_WHITESPACE = re.compile(r"[ \t\u00a0]+")
+BLANK_LINES = re.compile(r"\n{3,}")
+DIGITS = re.compile(r"\d+")
+
+def estimate_text_tokens(text: str) -> int:
+    """Approximate number of tokens of a text"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def normalize_line(line: str) -> str:
+    """Comparison key of a line: case, spacing and numbers (e.g. page numbers) are ignored"""
+    return DIGITS.sub("#", INLINE_WHITESPACE.sub(" ", line.strip().lower()))
+
+def strip_repeated_page_lines(pages: List[str]) -> List[str]:
+    """
+    Remove header and footer lines that repeat at the top or bottom of several pages.
+    The first page is kept whole: its header usually is the candidate's name and title.
+    """
+    if len(pages) < 2:
+        return pages
+
+    def edge_lines(lines: List[str]):
+        """Indexes of the first and of the last non-empty lines of a page"""
+        non_empty = [i for i, line in enumerate(lines) if line.strip()]
+        return non_empty[:HEADER_FOOTER_LINES], non_empty[-HEADER_FOOTER_LINES:]
+
+    page_lines = [page.split("\n") for page in pages]
+    header_counts = Counter()
+    footer_counts = Counter()
+    for lines in page_lines:
+        top, bottom = edge_lines(lines)
+        header_counts.update({normalize_line(lines[i]) for i in top})
+        footer_counts.update({normalize_line(lines[i]) for i in bottom})
+    min_pages = max(2, HEADER_FOOTER_MIN_PAGE_SHARE * len(pages))
+    headers = {line for line, count in header_counts.items() if count >= min_pages}
+    footers = {line for line, count in footer_counts.items() if count >= min_pages}
+    if not headers and not footers:
+        return pages
+
+    compacted_pages = [pages[0]]
+    for lines in page_lines[1:]:
+        top, bottom = edge_lines(lines)
+        removed = {i for i in top if normalize_line(lines[i]) in headers}
+        removed |= {i for i in bottom if normalize_line(lines[i]) in footers}
+        compacted_pages.append("\n".join(line for i, line in enumerate(lines) if i not in removed))
+    return compacted_pages
+
+def compact_table_row(line: str) -> str:
+    """Strip the padding of a markdown table row and shorten separator rows to |---|"""
+    cells = [cell.strip() for cell in line.strip().strip("|").split("|")]
+    if all(TABLE_SEPARATOR_CELL.match(cell) for cell in cells):
+        cells = ["---"] * len(cells)
+    return "| " + " | ".join(cells) + " |"
+
+def collapse_whitespace(text: str) -> str:
+    """Collapse runs of spaces, keep list indentation, pad tables minimally and allow at most one blank line"""
+    lines = []
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("|") and stripped.endswith("|") and len(stripped) > 1:
+            lines.append(compact_table_row(stripped))
+            continue
+        indent = line[:len(line) - len(line.lstrip())].replace("\t", "  ")
+        lines.append(indent + INLINE_WHITESPACE.sub(" ", stripped) if stripped else "")
+    return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+def deduplicate_blocks(text: str) -> str:
+    """Drop paragraphs, lists and tables that repeat an earlier block word for word"""
+    seen = set()
+    blocks = []
+    for block in text.split("\n\n"):
+        # Unlike header detection, numbers and case matter: blocks differing only in dates or scores are kept
+        key = INLINE_WHITESPACE.sub(" ", block.strip())
+        if key in seen:
+            continue
+        seen.add(key)
+        blocks.append(block)
+    return "\n\n".join(blocks)
+
+def truncate_to_budget(text: str, token_budget: int) -> str:
+    """
+    Cut text to the token budget, keeping whole lines from the start of the CV,
+    where name, contact details and the most recent experience usually are.
+    """
+    if estimate_text_tokens(text) <= token_budget:
+        return text
+    max_chars = max(0, token_budget * CHARS_PER_TOKEN - len(TRUNCATION_MARKER) - 1)
+    cut = text.rfind("\n", 0, max_chars + 1)
+    if cut <= 0:
+        cut = max_chars
+    return text[:cut].rstrip() + "\n" + TRUNCATION_MARKER
+
+def compact_cv(pages: List[str], token_budget: Optional[int] = None) -> dict:
+    """
+    Compact the OCR markdown of a CV, given per page, for scoring.
+    Returns the compacted content with the estimated tokens before and after.
+    """
+    token_budget = token_budget or CV_TOKEN_BUDGET
+    original = "".join(page + "\n" for page in pages if page)
+    original_tokens = estimate_text_tokens(original)
+    if not COMPACTION_ENABLED:
+        return {
+            "content": original,
+            "original_tokens": original_tokens,
+            "tokens": original_tokens,
+            "tokens_saved": 0,
+            "truncated": False
+        }
+
+    content = "\n\n".join(strip_repeated_page_lines([page for page in pages if page]))
+    content = deduplicate_blocks(collapse_whitespace(content))
+    compacted_tokens = estimate_text_tokens(content)
+    content = truncate_to_budget(content, token_budget)
+    tokens = estimate_text_tokens(content)
+    return {
+        "content": content,
+        "original_tokens": original_tokens,
+        "tokens": tokens,
+        "tokens_saved": original_tokens - tokens,
+        "truncated": tokens < compacted_tokens
+    }
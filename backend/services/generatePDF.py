@@ -1,4 +1,7 @@
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+from pypdf import PdfWriter
+from functools import lru_cache
 import io
 import datetime
 
@@ -6,29 +9,73 @@ LEFT_MARGIN = 60
 RIGHT_MARGIN = 60
 TOP_MARGIN = 780
 BOTTOM_MARGIN = 60
+PAGE_WIDTH = 595
 PAGE_HEIGHT = 842
 LINE_HEIGHT = 15
 ROW_HEIGHT = 22
+BODY_FONT = "Helvetica"
+BODY_FONT_SIZE = 10
+EXPLANATION_OFFSET = 200
+SUMMARY_WIDTH = PAGE_WIDTH - LEFT_MARGIN - RIGHT_MARGIN
+EXPLANATION_WIDTH = PAGE_WIDTH - RIGHT_MARGIN - (LEFT_MARGIN + EXPLANATION_OFFSET)
+
+def create_candidates_pdf(candidates, output=None, generated_at=None):
+    """
+    Render the candidates report. `output` is a file path or file object to write to;
+    without one the PDF is returned in a BytesIO. `generated_at` fixes the date on the title page.
+    """
+    buffer = output if output is not None else io.BytesIO()
+    p = canvas.Canvas(buffer)
+
+    draw_title_page(p, generated_at)
+    for candidate in candidates:
+        draw_candidate(p, candidate)
 
-def create_candidates_pdf(candidates):
+    p.save()
+    if output is None:
+        buffer.seek(0)
+    return buffer
+
+def render_title_page(generated_at=None) -> bytes:
+    """Render only the title page; used as the first part of a sharded report"""
     buffer = io.BytesIO()
     p = canvas.Canvas(buffer)
+    draw_title_page(p, generated_at)
+    p.save()
+    return buffer.getvalue()
+
+def render_candidates_shard(candidates) -> bytes:
+    """Render the pages of a slice of candidates without a title page; runs in a worker process"""
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer)
+    for candidate in candidates:
+        draw_candidate(p, candidate)
+    p.save()
+    return buffer.getvalue()
+
+def merge_pdfs(parts, output) -> None:
+    """Concatenate rendered PDF parts, in order, into `output` (a file path or file object)"""
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(io.BytesIO(part))
+    writer.write(output)
+    writer.close()
 
-    # Title page
+def draw_title_page(p, generated_at=None):
     p.setFont("Helvetica-Bold", 28)
     p.setFillColorRGB(0.07, 0.18, 0.36)
     ceveai_header = "CEVEAI"
     ceveai_width = p.stringWidth(ceveai_header, "Helvetica-Bold", 28)
-    p.drawString((595 - ceveai_width) / 2, PAGE_HEIGHT - 80, ceveai_header)
-    p.setFillColorRGB(0, 0, 0)  
+    p.drawString((PAGE_WIDTH - ceveai_width) / 2, PAGE_HEIGHT - 80, ceveai_header)
+    p.setFillColorRGB(0, 0, 0)
 
-    # Title 
+    # Title
     p.setFont("Helvetica-Bold", 32)
     title = "CV ANALYSIS REPORT"
-    title_y = (PAGE_HEIGHT // 2) + 60  
+    title_y = (PAGE_HEIGHT // 2) + 60
     p.drawString(LEFT_MARGIN, title_y, title)
 
-    now = datetime.datetime.now()
+    now = generated_at or datetime.datetime.now()
     date_str = now.strftime("%Y-%m-%d")
     time_str = now.strftime("%H:%M:%S")
     p.setFont("Helvetica", 14)
@@ -38,91 +85,95 @@ def create_candidates_pdf(candidates):
     p.drawString(LEFT_MARGIN, bottom_y, "Generated by CeVeAI")
     p.showPage()
 
-    def check_page_break(y, needed_space=LINE_HEIGHT):
-        if y - needed_space < BOTTOM_MARGIN:
-            p.showPage()
-            y = TOP_MARGIN
-        return y
+def draw_candidate(p, candidate):
+    """Draw one candidate section, starting on a new page and ending with a page break"""
+    y = TOP_MARGIN
 
-    for candidate in candidates:
-        y = TOP_MARGIN
+    p.setFont("Helvetica-Bold", 20)
+    candidate_name = str(candidate.get('candidate_name', ''))
+    total_score_str = f"{candidate.get('total_score', '')}/10"
 
-        p.setFont("Helvetica-Bold", 20)
-        candidate_name = str(candidate.get('candidate_name', ''))
-        total_score_str = f"{candidate.get('total_score', '')}/10"
-        
-        p.drawString(LEFT_MARGIN, TOP_MARGIN, candidate_name)
-      
-        score_width = p.stringWidth(total_score_str, "Helvetica-Bold", 20)
-        p.drawString(595 - RIGHT_MARGIN - score_width, TOP_MARGIN, total_score_str)
-        y = TOP_MARGIN - 20
-
-        p.setFont("Helvetica", 12)
-        p.drawString(LEFT_MARGIN, y, candidate.get('filename'))
-        y -= 18
-
-      
-        p.setFont("Helvetica-Bold", 30)
-        total_score_str = f"{candidate.get('total_score', '')}/10"
-       
-        score_width = p.stringWidth(total_score_str, "Helvetica-Bold", 30)
-        p.drawString(PAGE_HEIGHT - RIGHT_MARGIN - score_width, TOP_MARGIN, total_score_str)
-
-        y -= 20
-
-        p.setFont("Helvetica", 10)
-        summary = candidate.get('summary', '')
-        for line in split_text(summary, 100):
-            y = check_page_break(y)
-            p.drawString(LEFT_MARGIN, y, line)
-            y -= LINE_HEIGHT
-
-        y -= 40
-
-        p.setFont("Helvetica-Bold", 10)
-        p.drawCentredString(LEFT_MARGIN + 50, y, "Criteria")
-        p.drawCentredString(LEFT_MARGIN + 120 + 40, y, "Score")
-        p.drawString(LEFT_MARGIN + 200, y, "Reasoning")
-        y -= LINE_HEIGHT
-        p.setFont("Helvetica", 10)
-        p.line(LEFT_MARGIN, y + 5, 595 - RIGHT_MARGIN, y + 5)
-        y -= 5
-        y -= 5
-
-        for score in candidate.get("scores", []):
-            y = check_page_break(y, needed_space=ROW_HEIGHT)
-            p.drawCentredString(LEFT_MARGIN + 50, y, str(score.get('criterion', '')))
-            p.drawCentredString(LEFT_MARGIN + 120 + 40, y, str(score.get('score', '')))
-            explanation = score.get('explanation', '')
-            explanation_lines = split_text(explanation, 60)
-            if explanation_lines:
-                p.drawString(LEFT_MARGIN + 200, y, explanation_lines[0])
-                for expl_line in explanation_lines[1:]:
-                    y -= LINE_HEIGHT
-                    y = check_page_break(y, needed_space=ROW_HEIGHT)
-                    p.drawString(LEFT_MARGIN + 200, y, expl_line)
-            y -= ROW_HEIGHT
-
-        p.showPage()  # Page break after each candidate
+    p.drawString(LEFT_MARGIN, TOP_MARGIN, candidate_name)
 
-    p.save()
-    buffer.seek(0)
-    return buffer
+    score_width = p.stringWidth(total_score_str, "Helvetica-Bold", 20)
+    p.drawString(PAGE_WIDTH - RIGHT_MARGIN - score_width, TOP_MARGIN, total_score_str)
+    y = TOP_MARGIN - 20
+
+    p.setFont("Helvetica", 12)
+    p.drawString(LEFT_MARGIN, y, candidate.get('filename'))
+    y -= 18
+
+
+    p.setFont("Helvetica-Bold", 30)
+    total_score_str = f"{candidate.get('total_score', '')}/10"
+
+    score_width = p.stringWidth(total_score_str, "Helvetica-Bold", 30)
+    p.drawString(PAGE_HEIGHT - RIGHT_MARGIN - score_width, TOP_MARGIN, total_score_str)
+
+    y -= 20
+
+    p.setFont(BODY_FONT, BODY_FONT_SIZE)
+    summary = candidate.get('summary', '')
+    for line in wrap_text(summary, SUMMARY_WIDTH):
+        y = check_page_break(p, y)
+        p.drawString(LEFT_MARGIN, y, line)
+        y -= LINE_HEIGHT
 
-def split_text(text, max_length):
-    # Helper to split long text into lines of max_length
-    words = text.split()
+    y -= 40
+
+    p.setFont("Helvetica-Bold", 10)
+    p.drawCentredString(LEFT_MARGIN + 50, y, "Criteria")
+    p.drawCentredString(LEFT_MARGIN + 120 + 40, y, "Score")
+    p.drawString(LEFT_MARGIN + EXPLANATION_OFFSET, y, "Reasoning")
+    y -= LINE_HEIGHT
+    p.setFont(BODY_FONT, BODY_FONT_SIZE)
+    p.line(LEFT_MARGIN, y + 5, PAGE_WIDTH - RIGHT_MARGIN, y + 5)
+    y -= 5
+    y -= 5
+
+    for score in candidate.get("scores", []):
+        y = check_page_break(p, y, needed_space=ROW_HEIGHT)
+        p.drawCentredString(LEFT_MARGIN + 50, y, str(score.get('criterion', '')))
+        p.drawCentredString(LEFT_MARGIN + 120 + 40, y, str(score.get('score', '')))
+        explanation = score.get('explanation', '')
+        explanation_lines = wrap_text(explanation, EXPLANATION_WIDTH)
+        if explanation_lines:
+            p.drawString(LEFT_MARGIN + EXPLANATION_OFFSET, y, explanation_lines[0])
+            for expl_line in explanation_lines[1:]:
+                y -= LINE_HEIGHT
+                y = check_page_break(p, y, needed_space=ROW_HEIGHT)
+                p.drawString(LEFT_MARGIN + EXPLANATION_OFFSET, y, expl_line)
+        y -= ROW_HEIGHT
+
+    p.showPage()  # Page break after each candidate
+
+@lru_cache(maxsize=65536)
+def string_width(text, font_name=BODY_FONT, font_size=BODY_FONT_SIZE):
+    # Word widths repeat heavily across a report, so they are measured once
+    return pdfmetrics.stringWidth(text, font_name, font_size)
+
+@lru_cache(maxsize=4096)
+def wrap_text(text, max_width, font_name=BODY_FONT, font_size=BODY_FONT_SIZE):
+    """
+    Split text into lines that fit within max_width points in the given font.
+    A word wider than a whole line is put on a line of its own. Returns a tuple of lines.
+    """
+    space_width = string_width(" ", font_name, font_size)
     lines = []
-    current_line = ""
-    for word in words:
-        if len(current_line) + len(word) + 1 <= max_length:
-            current_line += (" " if current_line else "") + word
+    current_words = []
+    current_width = 0.0
+    for word in (text or "").split():
+        word_width = string_width(word, font_name, font_size)
+        if current_words and current_width + space_width + word_width > max_width:
+            lines.append(" ".join(current_words))
+            current_words = [word]
+            current_width = word_width
         else:
-            lines.append(current_line)
-            current_line = word
-    if current_line:
-        lines.append(current_line)
-    return lines
+            current_width += (space_width if current_words else 0.0) + word_width
+            current_words.append(word)
+    if current_words:
+        lines.append(" ".join(current_words))
+    return tuple(lines)
 
 def check_page_break(p, y, needed_space=LINE_HEIGHT):
     if y - needed_space < BOTTOM_MARGIN:
@@ -0,0 +1,225 @@
+import asyncio
+import io
+import logging
+import os
+import time
+import traceback
+import uuid
+from datetime import UTC, datetime, timedelta
+from typing import List, Optional
+from fastapi import UploadFile
+from sqlalchemy import and_, or_, select, update
+from starlette.datastructures import Headers
+from database import SessionLocal
+from models import JobAnalysis, JobAnalysisCriterion
+from .analysis import analyze_files, save_results
+from .metrics import DB_WRITE_SECONDS
+from .profiling import TIMING_PROFILE_ENABLED, AnalysisProfile, db_timer
+from .ocr_services import OCRService
+
+logger = logging.getLogger(__name__)
+
+# Number of analyses processed at the same time by this server process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Maximum number of analyses waiting for a worker before new ones are rejected
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+# How often each server process renews the heartbeat of the analyses it queued or runs
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+# Analyses whose heartbeat is older than this belong to a process that stopped, and are failed
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+# Identifies this server process in JobAnalysis.worker_id
+WORKER_ID = uuid.uuid4().hex
+ACTIVE_STATUSES = ["pending", "processing"]
+
+_job_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+
+def get_job_queue() -> asyncio.Queue:
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = asyncio.Queue(maxsize=JOB_QUEUE_SIZE)
+    return _job_queue
+
+async def read_uploads(files: List[UploadFile]) -> List[dict]:
+    """Read the uploads into memory; the request's files are closed as soon as the response is sent"""
+    uploads = []
+    for file in files:
+        file.file.seek(0)
+        uploads.append({
+            "filename": file.filename,
+            "content_type": file.content_type,
+            "data": await file.read()
+        })
+    return uploads
+
+def to_upload_file(upload: dict) -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(upload["data"]),
+        filename=upload["filename"],
+        headers=Headers({"content-type": upload["content_type"] or ""})
+    )
+
+def utc_now() -> datetime:
+    # Naive UTC, like JobAnalysis.created_at
+    return datetime.now(UTC).replace(tzinfo=None)
+
+def take_lease(job_analysis: JobAnalysis) -> None:
+    """Mark a background analysis as owned by this process, which keeps its heartbeat until it finishes"""
+    job_analysis.worker_id = WORKER_ID
+    job_analysis.heartbeat_at = utc_now()
+
+def initial_progress(uploads: List[dict]) -> List[dict]:
+    return [{"filename": upload["filename"], "status": "pending", "error": None} for upload in uploads]
+
+def enqueue_analysis(job_analysis_id, uploads: List[dict], parsed_criteria: List[dict], job_description: str,
+                     use_cache: bool = True, batch_scoring: Optional[bool] = None) -> None:
+    """Queue a persisted JobAnalysis for processing; raises asyncio.QueueFull if the queue is full"""
+    get_job_queue().put_nowait({
+        "job_analysis_id": job_analysis_id,
+        "uploads": uploads,
+        "parsed_criteria": parsed_criteria,
+        "job_description": job_description,
+        "use_cache": use_cache,
+        "batch_scoring": batch_scoring
+    })
+    logger.info(f"Queued job analysis {job_analysis_id} ({get_job_queue().qsize()} waiting)")
+
+async def run_analysis_job(job: dict) -> None:
+    """OCR, score and persist the CVs of a queued JobAnalysis, recording per-CV progress as it goes"""
+    job_analysis_id = job["job_analysis_id"]
+    profile = AnalysisProfile() if TIMING_PROFILE_ENABLED else None
+    async with SessionLocal() as db:
+        try:
+            job_analysis = (await db.execute(
+                select(JobAnalysis).where(JobAnalysis.id == job_analysis_id)
+            )).scalar_one_or_none()
+            if not job_analysis:
+                logger.error(f"Job analysis {job_analysis_id} not found")
+                return
+            job_analysis.status = "processing"
+            take_lease(job_analysis)
+            await db.commit()
+
+            # Each progress update is its own short transaction, so no connection is held during OCR and scoring.
+            # CVs report concurrently and share this session, which allows one commit at a time
+            progress_lock = asyncio.Lock()
+
+            async def on_event(event: str, index: int, data: dict) -> None:
+                async with progress_lock:
+                    progress = [dict(entry) for entry in job_analysis.progress]
+                    if event == "parsed":
+                        progress[index]["status"] = "scoring"
+                    elif event == "scored":
+                        progress[index]["status"] = "failed" if data.get("error") else "completed"
+                        progress[index]["error"] = data.get("error")
+                    job_analysis.progress = progress
+                    with db_timer(profile):
+                        await db.commit()
+
+            results = await analyze_files(
+                OCRService(),
+                [to_upload_file(upload) for upload in job["uploads"]],
+                job["parsed_criteria"],
+                job["job_description"],
+                use_cache=job["use_cache"],
+                on_event=on_event,
+                batch_scoring=job["batch_scoring"],
+                profile=profile
+            )
+
+            with DB_WRITE_SECONDS.time():
+                started_at = time.perf_counter()
+                job_analysis_criteria = (await db.execute(
+                    select(JobAnalysisCriterion).where(JobAnalysisCriterion.job_analysis_id == job_analysis_id)
+                )).scalars().all()
+                job_analysis_criteria_map = {c.criterion_id: c for c in job_analysis_criteria}
+                await save_results(db, job_analysis, job_analysis_criteria_map, job["parsed_criteria"], results)
+                job_analysis.status = "completed"
+                if profile:
+                    # The profile is written with the results, so it covers everything up to the final commit
+                    profile.db_seconds += time.perf_counter() - started_at
+                    job_analysis.timing_profile = profile.to_dict()
+                await db.commit()
+            logger.info(f"Job analysis {job_analysis_id} completed")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error in job analysis {job_analysis_id}: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            job_analysis = (await db.execute(
+                select(JobAnalysis).where(JobAnalysis.id == job_analysis_id)
+            )).scalar_one_or_none()
+            if job_analysis:
+                job_analysis.status = "failed"
+                job_analysis.error = str(e)
+                # Partial timings help to tell where a failed analysis spent its time
+                if profile:
+                    job_analysis.timing_profile = profile.to_dict()
+                await db.commit()
+
+async def renew_leases() -> None:
+    """Refresh the heartbeat of the analyses this process has queued or is running"""
+    async with SessionLocal() as db:
+        await db.execute(
+            update(JobAnalysis)
+            .where(JobAnalysis.worker_id == WORKER_ID, JobAnalysis.status.in_(ACTIVE_STATUSES))
+            .values(heartbeat_at=utc_now())
+        )
+        await db.commit()
+
+async def fail_orphaned_jobs() -> None:
+    """
+    Mark analyses left pending or processing by a server process that stopped as failed.
+    The queue and the uploads only live in the memory of that process, so these jobs can never be resumed.
+    Analyses of live processes, including the other workers of this deployment, keep a fresh heartbeat.
+    """
+    cutoff = utc_now() - timedelta(seconds=JOB_LEASE_SECONDS)
+    async with SessionLocal() as db:
+        result = await db.execute(
+            update(JobAnalysis)
+            .where(
+                JobAnalysis.status.in_(ACTIVE_STATUSES),
+                or_(
+                    JobAnalysis.heartbeat_at < cutoff,
+                    # Queued before heartbeats were recorded
+                    and_(JobAnalysis.heartbeat_at.is_(None), JobAnalysis.created_at < cutoff)
+                )
+            )
+            .values(status="failed", error="Interrupted by a server restart, please resubmit the analysis")
+        )
+        await db.commit()
+    if result.rowcount:
+        logger.warning(f"Marked {result.rowcount} interrupted job analyses as failed")
+
+async def job_heartbeat() -> None:
+    """Keep the leases of this process alive and fail the analyses of processes that stopped"""
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            await renew_leases()
+            await fail_orphaned_jobs()
+        except Exception as e:
+            logger.error(f"Error renewing job analysis heartbeats: {str(e)}")
+
+async def job_worker() -> None:
+    queue = get_job_queue()
+    while True:
+        job = await queue.get()
+        try:
+            await run_analysis_job(job)
+        except Exception as e:
+            logger.error(f"Unexpected error in job worker: {str(e)}")
+        finally:
+            queue.task_done()
+
+def start_job_workers() -> None:
+    for _ in range(JOB_WORKERS):
+        _workers.append(asyncio.create_task(job_worker()))
+    _workers.append(asyncio.create_task(job_heartbeat()))
+    logger.info(f"Started {JOB_WORKERS} job workers")
+
+async def stop_job_workers() -> None:
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
@@ -1,11 +1,45 @@
 from abc import ABC, abstractmethod
+import asyncio
+import logging
 import os
-from typing import List, Dict, Any
-from openai import OpenAI
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 import google.generativeai as genai
+from .metrics import record_token_usage
+from .rate_limiter import estimate_message_tokens, get_scheduler
+
+# Connection pool shared by all requests going to the provider
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+logger = logging.getLogger(__name__)
+
+# PROVIDER=hedged combines two providers: requests go to the primary, with a hedge and failover to the secondary
+LLM_PRIMARY_PROVIDER = os.getenv("LLM_PRIMARY_PROVIDER", "openai")
+LLM_SECONDARY_PROVIDER = os.getenv("LLM_SECONDARY_PROVIDER", "google")
+# A hedge request is sent once the primary is slower than this percentile of its recent latencies
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Hedge delay (seconds) until enough latencies have been recorded
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "20"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "500"))
+# After this many consecutive errors a provider is skipped for LLM_FAILOVER_COOLDOWN seconds
+LLM_FAILOVER_THRESHOLD = int(os.getenv("LLM_FAILOVER_THRESHOLD", "3"))
+LLM_FAILOVER_COOLDOWN = float(os.getenv("LLM_FAILOVER_COOLDOWN", "60"))
+
+# OpenAI models that accept a JSON schema as response_format; older models only get JSON mode
+OPENAI_JSON_SCHEMA_MODEL_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
 
 class BaseLLMService(ABC):
     """Base class for LLM services"""
+
+    # Provider identifier and the model used by generate_response, e.g. for cache keys
+    provider: str = ""
+    model_name: str = ""
     
     @abstractmethod
     async def generate_response(self, messages: List[Dict[str, str]], **kwargs) -> str:
@@ -17,44 +51,119 @@ class BaseLLMService(ABC):
         """Generate a response from the LLM for vision tasks"""
         pass
 
+    async def generate_json(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = "response", **kwargs) -> str:
+        """Generate a JSON response following `schema`, using the provider's structured output mode when available"""
+        return await self.generate_response(messages, **kwargs)
+
+    async def close(self) -> None:
+        """Release the connections held by the service"""
+        pass
+
+    def latency_stats(self) -> Dict[str, Any]:
+        """Latency statistics of the service's requests, if it records any"""
+        return {}
+
+    async def schedule(self, model: str, messages: List[Dict[str, Any]], call):
+        """Run a provider call through the model's rate limit scheduler (pacing, AIMD concurrency, retries)"""
+        response = await get_scheduler(self.provider, model).run(call, estimate_message_tokens(messages))
+        record_token_usage(self.provider, model, response)
+        return response
+
 class OpenAIService(BaseLLMService):
     """OpenAI implementation of the LLM service"""
+
+    provider = "openai"
     
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=api_key)
+        # One pooled HTTP client for the lifetime of the service, reused by every request
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=LLM_TIMEOUT
+        )
+        # Retries are handled by the rate limit scheduler
+        self.client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+        self.model_name = "gpt-3.5-turbo"
+        self.vision_model_name = "gpt-4o"
     
     async def generate_response(self, messages: List[Dict[str, str]], **kwargs) -> str:
-        response = self.client.chat.completions.create(
-            model=kwargs.get("model", "gpt-3.5-turbo"),
+        model = kwargs.pop("model", self.model_name)
+        response = await self.schedule(model, messages, lambda: self.client.chat.completions.create(
+            model=model,
             messages=messages,
             **kwargs
-        )
+        ))
         return response.choices[0].message.content
+
+    async def generate_json(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = "response", **kwargs) -> str:
+        model = kwargs.get("model", self.model_name)
+        if model.startswith(OPENAI_JSON_SCHEMA_MODEL_PREFIXES):
+            response_format = {
+                "type": "json_schema",
+                "json_schema": {"name": name, "schema": schema, "strict": True}
+            }
+        else:
+            response_format = {"type": "json_object"}
+        return await self.generate_response(messages, response_format=response_format, **kwargs)
     
     async def generate_vision(self, messages: List[Dict[str, Any]], **kwargs) -> str:
-        response = self.client.chat.completions.create(
-            model="gpt-4o",
+        model = kwargs.pop("model", self.vision_model_name)
+        max_tokens = kwargs.pop("max_tokens", 4096)
+        response = await self.schedule(model, messages, lambda: self.client.chat.completions.create(
+            model=model,
             messages=messages,
-            max_tokens=4096,
+            max_tokens=max_tokens,
             **kwargs
-        )
+        ))
         return response.choices[0].message.content
 
+    async def close(self) -> None:
+        await self.client.close()
+
+def to_gemini_schema(schema):
+    """Gemini accepts a subset of JSON schema without additionalProperties"""
+    if isinstance(schema, dict):
+        return {key: to_gemini_schema(value) for key, value in schema.items() if key != "additionalProperties"}
+    if isinstance(schema, list):
+        return [to_gemini_schema(value) for value in schema]
+    return schema
+
 class GeminiService(BaseLLMService):
     """Google Gemini implementation of the LLM service"""
+
+    provider = "google"
     
     def __init__(self):
         api_key = os.getenv("GOOGLE_API_KEY")
         genai.configure(api_key=api_key)
-        self.chat_model = genai.GenerativeModel('gemini-1.5-flash')
-        self.vision_model = genai.GenerativeModel('gemini-1.5-flash')
+        self.model_name = 'gemini-1.5-flash'
+        self.vision_model_name = 'gemini-1.5-flash'
+        self.chat_model = genai.GenerativeModel(self.model_name)
+        self.vision_model = genai.GenerativeModel(self.vision_model_name)
+
+    async def _generate(self, model, *args, **kwargs):
+        """Call the native async API, or run the blocking call in a worker thread if it is unavailable"""
+        if hasattr(model, "generate_content_async"):
+            return await model.generate_content_async(*args, **kwargs)
+        return await asyncio.to_thread(model.generate_content, *args, **kwargs)
     
     async def generate_response(self, messages: List[Dict[str, str]], **kwargs) -> str:
         # Convert OpenAI message format to Gemini format
         prompt = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
-        response = self.chat_model.generate_content(prompt)
+        response = await self.schedule(
+            self.model_name, messages, lambda: self._generate(self.chat_model, prompt, **kwargs)
+        )
         return response.text
+
+    async def generate_json(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = "response", **kwargs) -> str:
+        generation_config = {
+            "response_mime_type": "application/json",
+            "response_schema": to_gemini_schema(schema)
+        }
+        return await self.generate_response(messages, generation_config=generation_config, **kwargs)
     
     async def generate_vision(self, messages: List[Dict[str, Any]], **kwargs) -> str:
         # Extract the system prompt and user content
@@ -84,27 +193,182 @@ class GeminiService(BaseLLMService):
         prompt = f"{system_prompt}\n{''.join(text_parts)}"
         
         # Generate response using vision model
-        response = self.vision_model.generate_content(
+        response = await self.schedule(self.vision_model_name, messages, lambda: self._generate(
+            self.vision_model,
             contents=[prompt, *image_parts],
             **kwargs
-        )
+        ))
         return response.text
 
-def get_llm_service() -> BaseLLMService:
+class LatencyStats:
+    """Latencies of the most recent successful requests plus error, hedge and failover counters"""
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.unhealthy_until = 0.0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def record_success(self, latency: float) -> None:
+        self.requests += 1
+        self.latencies.append(latency)
+        self.consecutive_errors = 0
+
+    def record_error(self) -> None:
+        self.requests += 1
+        self.errors += 1
+        self.consecutive_errors += 1
+        if self.consecutive_errors >= LLM_FAILOVER_THRESHOLD:
+            self.unhealthy_until = time.monotonic() + LLM_FAILOVER_COOLDOWN
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY
+        return self.percentile(LLM_HEDGE_PERCENTILE)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "healthy": self.healthy(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers
+        }
+
+class HedgedLLMService(BaseLLMService):
+    """
+    Sends each request to the primary service and, if it is slower than its usual latency percentile,
+    a hedge request to the secondary; the first successful answer wins and the other is cancelled.
+    Errors fail over to the other service, and a service that keeps failing is skipped for a while.
+    Latencies are tracked per service and per kind of request (text or vision).
+    """
+
+    def __init__(self, primary: BaseLLMService, secondary: BaseLLMService):
+        self.services = [primary, secondary]
+        # Image preprocessing and cache keys follow the primary service
+        self.provider = primary.provider
+        self.model_name = f"{primary.model_name}|{secondary.model_name}"
+        self.stats: Dict[str, LatencyStats] = {}
+
+    def _stats(self, service: BaseLLMService, kind: str) -> LatencyStats:
+        key = f"{service.provider}:{kind}"
+        if key not in self.stats:
+            self.stats[key] = LatencyStats()
+        return self.stats[key]
+
+    async def _timed(self, service: BaseLLMService, kind: str, method: str, *args, **kwargs) -> str:
+        stats = self._stats(service, kind)
+        started_at = time.monotonic()
+        try:
+            result = await getattr(service, method)(*args, **kwargs)
+        except asyncio.CancelledError:
+            # A request that lost the race took at least this long; leaving it out would hide the slow tail
+            stats.latencies.append(time.monotonic() - started_at)
+            raise
+        except Exception:
+            stats.record_error()
+            raise
+        stats.record_success(time.monotonic() - started_at)
+        return result
+
+    async def _hedged(self, kind: str, method: str, *args, **kwargs) -> str:
+        primary, secondary = self.services
+        # Skip a failing primary while the secondary is healthy
+        if not self._stats(primary, kind).healthy() and self._stats(secondary, kind).healthy():
+            primary, secondary = secondary, primary
+        primary_stats = self._stats(primary, kind)
+        secondary_stats = self._stats(secondary, kind)
+
+        tasks = {asyncio.ensure_future(self._timed(primary, kind, method, *args, **kwargs)): primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=primary_stats.hedge_delay())
+            hedged = not done and secondary_stats.healthy()
+            if hedged:
+                primary_stats.hedges += 1
+                tasks[asyncio.ensure_future(self._timed(secondary, kind, method, *args, **kwargs))] = secondary
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged and tasks[task] is not primary:
+                            primary_stats.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+                    if len(tasks) == 1:
+                        # Fail over once the primary has errored and no hedge is running
+                        logger.warning(f"{primary.provider} request failed ({type(error).__name__}), failing over to {secondary.provider}")
+                        primary_stats.failovers += 1
+                        task = asyncio.ensure_future(self._timed(secondary, kind, method, *args, **kwargs))
+                        tasks[task] = secondary
+                        pending.add(task)
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_response(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        return await self._hedged("text", "generate_response", messages, **kwargs)
+
+    async def generate_json(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = "response", **kwargs) -> str:
+        return await self._hedged("text", "generate_json", messages, schema, name, **kwargs)
+
+    async def generate_vision(self, messages: List[Dict[str, Any]], **kwargs) -> str:
+        return await self._hedged("vision", "generate_vision", messages, **kwargs)
+
+    def latency_stats(self) -> Dict[str, Any]:
+        return {key: stats.to_dict() for key, stats in self.stats.items()}
+
+# Services are created once per provider so their HTTP clients are shared across requests
+_llm_services: Dict[str, BaseLLMService] = {}
+
+def get_llm_service(provider: Optional[str] = None) -> BaseLLMService:
     """Factory function to get the appropriate LLM service based on available API keys"""
     
-    provider = os.getenv("PROVIDER")
+    provider = provider or os.getenv("PROVIDER")
+
+    if provider in _llm_services:
+        return _llm_services[provider]
 
     if provider == "openai":
-        return OpenAIService()
+        service = OpenAIService()
     elif provider == "google":
-        return GeminiService()
+        service = GeminiService()
+    elif provider == "hedged":
+        service = HedgedLLMService(get_llm_service(LLM_PRIMARY_PROVIDER), get_llm_service(LLM_SECONDARY_PROVIDER))
     else:
         raise ValueError("No API keys found. Please set either OPENAI_API_KEY or GOOGLE_API_KEY in your .env file") 
+
+    _llm_services[provider] = service
+    return service
     
     #if openai_key:
     #    return OpenAIService(openai_key)
     #elif gemini_key:
     #    return GeminiService(gemini_key)
     #else:
-    #    raise ValueError("No API keys found. Please set either OPENAI_API_KEY or GOOGLE_API_KEY in your .env file") 
\ No newline at end of file
+    #    raise ValueError("No API keys found. Please set either OPENAI_API_KEY or GOOGLE_API_KEY in your .env file") 
+
+async def close_llm_services() -> None:
+    """Close every cached LLM service, e.g. on application shutdown"""
+    for service in _llm_services.values():
+        await service.close()
+    _llm_services.clear()
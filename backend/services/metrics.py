@@ -0,0 +1,80 @@
+from contextlib import contextmanager
+
+# prometheus_client is optional: without it every metric is a no-op and /metrics is unavailable
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+    METRICS_AVAILABLE = True
+except ImportError:
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    METRICS_AVAILABLE = False
+
+# Latency buckets (seconds) from fast cache hits up to slow vision calls
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value) -> None:
+        pass
+
+    def inc(self, amount=1) -> None:
+        pass
+
+    @contextmanager
+    def time(self):
+        yield
+
+def _histogram(name, documentation, labels=(), buckets=FAST_BUCKETS):
+    if not METRICS_AVAILABLE:
+        return _NoopMetric()
+    return Histogram(name, documentation, labels, buckets=buckets)
+
+def _counter(name, documentation, labels=()):
+    if not METRICS_AVAILABLE:
+        return _NoopMetric()
+    return Counter(name, documentation, labels)
+
+# Pipeline stages
+RASTERIZE_PAGE_SECONDS = _histogram(
+    "ceveai_rasterize_page_seconds", "Time to rasterize and preprocess one PDF page in a worker process"
+)
+OCR_PAGE_SECONDS = _histogram(
+    "ceveai_ocr_page_seconds", "Time of the vision OCR call for one page", ["provider"], SLOW_BUCKETS
+)
+SCORING_CV_SECONDS = _histogram(
+    "ceveai_scoring_cv_seconds", "Time from a CV's OCR result to its scores", ["provider"], SLOW_BUCKETS
+)
+DB_WRITE_SECONDS = _histogram(
+    "ceveai_db_write_seconds", "Time to persist the job analysis and results of one analysis"
+)
+HTTP_REQUEST_SECONDS = _histogram(
+    "ceveai_http_request_seconds", "Time until the response of an HTTP request starts",
+    ["method", "route", "status"], SLOW_BUCKETS
+)
+
+# LLM usage
+LLM_CALLS = _counter("ceveai_llm_calls_total", "LLM requests sent, including retries", ["provider", "model"])
+LLM_FAILURES = _counter("ceveai_llm_failures_total", "LLM requests that raised an error", ["provider", "model"])
+LLM_RETRIES = _counter("ceveai_llm_retries_total", "LLM requests retried after a rate limit or transient error", ["provider", "model"])
+LLM_TOKENS = _counter("ceveai_llm_tokens_total", "Tokens billed by the provider", ["provider", "model", "type"])
+CACHE_HITS = _counter("ceveai_cache_hits_total", "Cache hits", ["cache"])
+
+def record_token_usage(provider: str, model: str, response) -> None:
+    """Count the prompt and completion tokens of an OpenAI (usage) or Gemini (usage_metadata) response"""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0)
+        completion_tokens = getattr(usage, "completion_tokens", 0)
+    else:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_token_count", 0)
+        completion_tokens = getattr(usage, "candidates_token_count", 0)
+    LLM_TOKENS.labels(provider, model, "prompt").inc(prompt_tokens or 0)
+    LLM_TOKENS.labels(provider, model, "completion").inc(completion_tokens or 0)
+
+def render_metrics() -> bytes:
+    return generate_latest() if METRICS_AVAILABLE else b""
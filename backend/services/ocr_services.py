@@ -1,70 +1,508 @@
 import os
 import base64
+import copy
 import json
-from typing import List, Dict, Any, Optional
+from dataclasses import asdict
+from typing import AsyncIterator, List, Dict, Any, Optional
 from fastapi import UploadFile
 from dotenv import load_dotenv
-import pandas as pd
-import io
 from .llm_service import get_llm_service
-import re
-from tempfile import NamedTemporaryFile
-from pdf2image import convert_from_path
+from .metrics import CACHE_HITS, OCR_PAGE_SECONDS, RASTERIZE_PAGE_SECONDS
+from .profiling import page_trace
+from .rasterizer import PreprocessOptions, pdf_page_count, render_page, run_in_pool
+from .cache import DiskLRUCache, TTLCache, sha256_hex
+from .text_layer import (
+    TEXT_LAYER_ENABLED, TEXT_LAYER_MIN_ALNUM_RATIO, TEXT_LAYER_MIN_CHARS, extract_text_layer, is_sparse, text_to_markdown
+)
 import asyncio
+import time
 
 
 # Load environment variables
 load_dotenv()
 
+# Maximum number of pages of a single document that are OCR'd at the same time
+OCR_PAGE_CONCURRENCY = int(os.getenv("OCR_PAGE_CONCURRENCY", "4"))
+# Maximum number of vision calls in flight across all documents and requests
+OCR_GLOBAL_CONCURRENCY = int(os.getenv("OCR_GLOBAL_CONCURRENCY", "16"))
+# Maximum number of CVs of a single analysis that are scored at the same time
+SCORING_CONCURRENCY = int(os.getenv("SCORING_CONCURRENCY", "8"))
+
+# Persistent OCR cache mapping document and page hashes to the extracted markdown
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", ".cache/ocr")
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Bump to invalidate cached OCR output, e.g. after changing the OCR prompt or model
+OCR_CACHE_VERSION = os.getenv("OCR_CACHE_VERSION", "1")
+
+# In-memory cache of scoring results for identical (CV, job description, criteria, model) inputs
+SCORING_CACHE_ENABLED = os.getenv("SCORING_CACHE_ENABLED", "true").lower() == "true"
+SCORING_CACHE_TTL = float(os.getenv("SCORING_CACHE_TTL", str(24 * 60 * 60)))
+SCORING_CACHE_MAX_ENTRIES = int(os.getenv("SCORING_CACHE_MAX_ENTRIES", "2000"))
+# How often the criteria missing from a scoring response are requested again
+SCORING_REPAIR_ATTEMPTS = int(os.getenv("SCORING_REPAIR_ATTEMPTS", "2"))
+
+OCR_SYSTEM_PROMPT = """
+You are an OCR assistant powered by a Vision-Language Model. Your job is to extract text and formatting information from any document, regardless of its format (images, PDFs, handwritten notes, etc.). You must output all extracted content in a well-organized Markdown document.
+Key requirements:
+Comprehensive Extraction: Capture every bit of text present in the document.
+Structured Markdown Output: Organize the extracted text into a structured Markdown format.
+Formatting Preservation:
+Headers: Convert document headers into Markdown headers (using #, ##, etc.).
+Footers: Identify and annotate footers appropriately.
+Tables: Recognize tables and render them using Markdown table syntax.
+Additional Features: Include lists, bold or italic text, page breaks, and any other formatting cues that can be represented in Markdown.
+Detail-Oriented: Ensure that nothing is omitted—extract and present all available information from the document.
+Your final output should be a single, structured Markdown document that faithfully represents both the content and the formatting of the original input.
+"""
+
+SCORING_JSON_FORMAT_PROMPT = """You are a JSON-first assistant. Always respond with valid JSON that follows this exact structure:
+{
+    "candidate": "string",
+    "scores": {
+        "<criterion_name>": {
+            "score": number,
+            "explanation": "string"
+        }
+    },
+    "summary": "string"
+}
+
+Example with multiple criteria:
+{
+    "candidate": "John Doe",
+    "scores": {
+        "Criterion 1": {
+            "score": 8.5,
+            "explanation": "Strong proficiency in required technologies"
+        },
+        "Criterion 2": {
+            "score": 7.0,
+            "explanation": "Relevant work history in the field"
+        },
+        "Criterion 3": {
+            "score": 9.0,
+            "explanation": "Excellent academic background"
+        }
+    },
+    "summary": "John Doe is a qualified candidate with strong technical skills and relevant experience..."
+}
+
+Rules:
+1. All objects must be properly closed
+2. Use double quotes for strings
+3. Use numbers (not strings) for scores
+4. No trailing commas
+5. No comments or markdown formatting
+6. Use the exact criterion names provided in the criteria list
+7. Include ALL criteria from the provided list"""
+
+BATCH_SCORING_JSON_FORMAT_PROMPT = """You are a JSON-first assistant. You are given several CVs, each introduced by a line "=== CV file: <filename> ===".
+Score every CV independently of the others and respond with a JSON array containing exactly one object per CV, in the order given:
+[
+    {
+        "filename": "string",
+        "candidate": "string",
+        "scores": {
+            "<criterion_name>": {
+                "score": number,
+                "explanation": "string"
+            }
+        },
+        "summary": "string"
+    }
+]
+
+Rules:
+1. "filename" must be copied exactly from the CV's header line
+2. All objects must be properly closed
+3. Use double quotes for strings
+4. Use numbers (not strings) for scores
+5. No trailing commas
+6. No comments or markdown formatting
+7. Use the exact criterion names provided in the criteria list
+8. Include ALL criteria from the provided list for every CV"""
+
+def build_scores_schema(criteria: List[dict], scores_only: bool = False) -> dict:
+    """JSON schema of a scoring response with one required entry per criterion"""
+    scores_schema = {
+        "type": "object",
+        "properties": {
+            c["name"]: {
+                "type": "object",
+                "properties": {
+                    "score": {"type": "number"},
+                    "explanation": {"type": "string"}
+                },
+                "required": ["score", "explanation"],
+                "additionalProperties": False
+            }
+            for c in criteria
+        },
+        "required": [c["name"] for c in criteria],
+        "additionalProperties": False
+    }
+    if scores_only:
+        properties = {"scores": scores_schema}
+    else:
+        properties = {
+            "candidate": {"type": "string"},
+            "scores": scores_schema,
+            "summary": {"type": "string"}
+        }
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+def validate_scores(scores, criteria: List[dict]):
+    """
+    Split a scores dict into valid entries (a number from 0 to 10 and an explanation), keyed by
+    criterion name, and the criteria that are missing or malformed
+    """
+    if not isinstance(scores, dict):
+        scores = {}
+    valid = {}
+    missing = []
+    for c in criteria:
+        entry = scores.get(c["name"])
+        try:
+            score = float(entry["score"])
+            if not 0 <= score <= 10:
+                raise ValueError(f"Score {score} out of range")
+        except (TypeError, KeyError, ValueError):
+            missing.append(c)
+            continue
+        explanation = entry.get("explanation")
+        valid[c["name"]] = {
+            "score": score,
+            "explanation": explanation if isinstance(explanation, str) else ""
+        }
+    return valid, missing
+
+def parse_json_response(response: str):
+    """Parse a JSON response, tolerating markdown code fences around it"""
+    response = response.strip()
+    if response.startswith("```json"):
+        response = response[7:]
+    if response.startswith("```"):
+        response = response[3:]
+    if response.endswith("```"):
+        response = response[:-3]
+    return json.loads(response.strip())
+
+_global_ocr_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_global_ocr_semaphore() -> asyncio.Semaphore:
+    """Semaphore shared by every OCRService instance to cap concurrent vision calls"""
+    global _global_ocr_semaphore
+    if _global_ocr_semaphore is None:
+        _global_ocr_semaphore = asyncio.Semaphore(OCR_GLOBAL_CONCURRENCY)
+    return _global_ocr_semaphore
+
+_ocr_cache: Optional[DiskLRUCache] = None
+
+def get_ocr_cache() -> Optional[DiskLRUCache]:
+    """Shared OCR cache, or None if caching is disabled"""
+    global _ocr_cache
+    if OCR_CACHE_ENABLED and _ocr_cache is None:
+        _ocr_cache = DiskLRUCache(OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES)
+    return _ocr_cache
+
+scoring_cache = TTLCache(SCORING_CACHE_TTL, SCORING_CACHE_MAX_ENTRIES)
+
+def scoring_cache_key(cv_content: str, job_description: str, criteria: List[dict], model_name: str) -> str:
+    """Cache key over everything that influences a CV's scores; criteria order matters"""
+    criteria_key = json.dumps([[c["name"], c["description"]] for c in criteria])
+    return ":".join([
+        sha256_hex(cv_content),
+        sha256_hex(job_description),
+        sha256_hex(criteria_key),
+        sha256_hex(model_name)
+    ])
+
+# Pages of a cached document are stored in one entry, separated by a form feed
+PAGE_SEPARATOR = "\f"
+
+# Documents currently being parsed, keyed by cache key, so identical uploads are only OCR'd once
+_inflight_documents: Dict[str, asyncio.Future] = {}
+
 class OCRService:
-    def __init__(self):
+    def __init__(self, page_concurrency: Optional[int] = None, preprocess_options: Optional[PreprocessOptions] = None):
         self.llm_service = get_llm_service()
+        self.page_concurrency = page_concurrency or OCR_PAGE_CONCURRENCY
+        self.preprocess_options = preprocess_options or PreprocessOptions(provider=self.llm_service.provider)
+        self.ocr_cache_namespace = self.build_ocr_cache_namespace()
+
+    def build_ocr_cache_namespace(self) -> str:
+        """
+        Part of the OCR cache keys identifying how a document becomes markdown: provider, vision model,
+        image preprocessing and text layer settings. Changing any of them starts a fresh set of entries.
+        """
+        settings = {
+            "provider": self.llm_service.provider,
+            "model": getattr(self.llm_service, "vision_model_name", self.llm_service.model_name),
+            "preprocess": {
+                name: value for name, value in asdict(self.preprocess_options).items() if name != "report_savings"
+            },
+            "text_layer": [TEXT_LAYER_ENABLED, TEXT_LAYER_MIN_CHARS, TEXT_LAYER_MIN_ALNUM_RATIO]
+        }
+        return sha256_hex(json.dumps(settings, sort_keys=True))[:16]
         
-    async def encode_image(self, image_file):
-        """Encode image to base64"""
-        # If image_file is already bytes, just encode it
-        if isinstance(image_file, bytes):
-            return base64.b64encode(image_file).decode("utf-8")
-        # If it's a file-like object, read it
-        if hasattr(image_file, 'read'):
-            contents = image_file.read()
-            if asyncio.iscoroutine(contents):
-                contents = await contents
-            return base64.b64encode(contents).decode("utf-8")
-        return None
-    
-    async def pdf_to_images(self, pdf_file: UploadFile) -> List[dict]:
+    async def extract_text_pages(self, pdf_file: UploadFile, pdf_bytes: bytes) -> List[str]:
         """
-        Convert a PDF UploadFile to a list of dicts with the original PDF filename and the image file-like object.
-        Each dict: { 'pdf_filename': ..., 'image': ... }
+        Extract the embedded text layer of each page of a PDF UploadFile.
+        Returns an empty list when the text layer is disabled or cannot be read.
         """
-        # Save the PDF to a temporary file
-        temp_pdf = NamedTemporaryFile(delete=False, suffix=".pdf")
-        temp_pdf.write(await pdf_file.read())
-        temp_pdf.close()
-
-        # Convert PDF to images (one per page)
-        images = convert_from_path(temp_pdf.name)
-        image_files = []
-        for i, image in enumerate(images):
-            temp_img = NamedTemporaryFile(delete=False, suffix=".jpg")
-            image.save(temp_img, format="JPEG")
-            temp_img.close()
-            f = open(temp_img.name, "rb")
-            class SimpleFile:
-                def __init__(self, file, name):
-                    self.file = file
-                    self.name = name
-                def read(self):
-                    return self.file.read()
-                def close(self):
-                    self.file.close()
-            image_files.append({
-                'pdf_filename': pdf_file.filename,
-                'image': SimpleFile(f, temp_img.name)
-            })
-        return image_files
+        if not TEXT_LAYER_ENABLED:
+            return []
+        try:
+            return await asyncio.to_thread(extract_text_layer, pdf_bytes)
+        except Exception as e:
+            print(f"Could not extract text layer from {pdf_file.filename}: {str(e)}")
+            return []
+
+    async def pdf_to_images(self, pdf_file: UploadFile, pdf_bytes: bytes, pages: Optional[List[int]] = None) -> AsyncIterator[dict]:
+        """
+        Rasterize a PDF in memory and yield one dict per page, one page at a time.
+        Only the given 1-based page numbers are rasterized; all pages if `pages` is None.
+        Each dict: { 'pdf_filename': ..., 'page': ..., 'image': <JPEG bytes>, 'stats': ..., 'error': ... }
+        """
+        if pages is None:
+            page_count = await asyncio.to_thread(pdf_page_count, pdf_bytes)
+            pages = list(range(1, page_count + 1))
+        for page in pages:
+            try:
+                # Rasterization and JPEG encoding are CPU-bound and run in the process pool
+                rendered = await run_in_pool(render_page, pdf_bytes, page, self.preprocess_options)
+                RASTERIZE_PAGE_SECONDS.observe(rendered['stats']['render_seconds'])
+                timing = page_trace(page)
+                if timing is not None:
+                    timing["rasterize_seconds"] = rendered['stats']['render_seconds']
+                yield {
+                    'pdf_filename': pdf_file.filename,
+                    'page': page,
+                    'image': rendered['image'],
+                    'stats': rendered['stats']
+                }
+            except Exception as e:
+                # Report the page as failed instead of aborting the whole document
+                print(f"Error rasterizing page {page} of {pdf_file.filename}: {str(e)}")
+                yield {'pdf_filename': pdf_file.filename, 'page': page, 'image': None, 'error': str(e)}
     
+    async def ocr_page(self, idx: int, image_file: dict) -> str:
+        """Run vision OCR on a single page image and return its markdown"""
+        image_data = image_file['image']
+        timing = page_trace(image_file['page'])
+
+        page_key = f"page:{OCR_CACHE_VERSION}:{self.ocr_cache_namespace}:{sha256_hex(image_data)}"
+        ocr_cache = get_ocr_cache()
+        if ocr_cache:
+            # Disk I/O (and eviction scans on writes) run in a thread to keep the event loop free
+            cached_markdown = await asyncio.to_thread(ocr_cache.get, page_key)
+            if cached_markdown is not None:
+                print(f"OCR cache hit for image {idx + 1}")
+                CACHE_HITS.labels("ocr_page").inc()
+                if timing is not None:
+                    timing["cached"] = True
+                return cached_markdown
+
+        image_base64 = base64.b64encode(image_data).decode("utf-8")
+
+        messages = [
+            {"role": "system", "content": OCR_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Please extract all text and formatting from this image and present it as a well-structured Markdown document."
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{image_base64}",
+                            "detail": self.preprocess_options.detail
+                        }
+                    }
+                ]
+            }
+        ]
+
+        started_at = time.perf_counter()
+        with OCR_PAGE_SECONDS.labels(self.llm_service.provider).time():
+            response = await self.llm_service.generate_vision(messages)
+        if timing is not None:
+            timing["ocr_seconds"] = time.perf_counter() - started_at
+        print(f"Got response for image {idx + 1}, length: {len(response)}")
+        if ocr_cache and response:
+            await asyncio.to_thread(ocr_cache.set, page_key, response)
+        return response
+
+    async def ocr_pages(self, images: AsyncIterator[dict]) -> List[dict]:
+        """
+        OCR the pages produced by `images` concurrently, bounded by the per-document and global limits.
+        The next page is only rasterized once a per-document slot is free, so at most
+        `page_concurrency` page images of a document are held in memory.
+        Returns one dict per page in page order: { 'page': ..., 'markdown': ..., 'error': ... }
+        """
+        document_semaphore = asyncio.Semaphore(self.page_concurrency)
+        global_semaphore = get_global_ocr_semaphore()
+
+        async def run(idx: int, image_file: dict) -> dict:
+            page = image_file['page']
+            try:
+                if image_file.get('error'):
+                    return {"page": page, "markdown": "", "error": image_file['error'], "source": "vision"}
+                async with global_semaphore:
+                    print(f"Processing image {idx + 1} (page {page})")
+                    markdown = await self.ocr_page(idx, image_file)
+                    return {
+                        "page": page,
+                        "markdown": markdown,
+                        "error": None,
+                        "source": "vision",
+                        "preprocessing": image_file.get('stats')
+                    }
+            except Exception as e:
+                print(f"Error processing image {idx + 1}: {str(e)}")
+                return {"page": page, "markdown": "", "error": str(e), "source": "vision"}
+            finally:
+                document_semaphore.release()
+
+        tasks = []
+        try:
+            while True:
+                await document_semaphore.acquire()
+                try:
+                    image_file = await images.__anext__()
+                except StopAsyncIteration:
+                    document_semaphore.release()
+                    break
+                tasks.append(asyncio.ensure_future(run(len(tasks), image_file)))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            await images.aclose()
+
+        # gather keeps the results in page order regardless of completion order
+        return await asyncio.gather(*tasks)
+
+    async def parse_pdf(self, document_file: UploadFile, pdf_bytes: bytes) -> Dict[str, Any]:
+        """Extract the markdown of a PDF from its text layer, falling back to vision OCR per page"""
+        try:
+            # Fast path: use the embedded text layer wherever it is good enough
+            text_pages = await self.extract_text_pages(document_file, pdf_bytes)
+            vision_pages = [
+                idx + 1 for idx, text in enumerate(text_pages) if is_sparse(text)
+            ] if text_pages else None
+            page_results = [
+                {"page": idx + 1, "markdown": text_to_markdown(text), "error": None, "source": "text"}
+                for idx, text in enumerate(text_pages)
+                if idx + 1 not in vision_pages
+            ]
+            print(f"Using text layer for {len(page_results)}/{len(text_pages)} pages")
+
+            # Fall back to vision OCR for pages without a usable text layer
+            if vision_pages is None or vision_pages:
+                print("Processing as PDF document - converting to images")
+                images = self.pdf_to_images(document_file, pdf_bytes, pages=vision_pages)
+                page_results += await self.ocr_pages(images)
+
+            if not page_results:
+                return {
+                    "document_type": "PDF",
+                    "markdown_content": "",
+                    "items": [],
+                    "error": "No images extracted from PDF",
+                    "scores": {}
+                }
+
+            page_results.sort(key=lambda page: page["page"])
+            all_markdown = "".join(
+                page["markdown"] + "\n" for page in page_results if page["markdown"]
+            )
+            page_errors = [
+                {"page": page["page"], "error": page["error"]}
+                for page in page_results if page["error"]
+            ]
+
+            if not all_markdown:
+                return {
+                    "document_type": "PDF",
+                    "markdown_content": "",
+                    "items": [],
+                    "error": "Failed to extract text from PDF",
+                    "page_errors": page_errors,
+                    "scores": {}
+                }
+
+            return {
+                "document_type": "PDF",
+                "markdown_content": all_markdown,
+                "pages": [page["markdown"] for page in page_results if page["markdown"]],
+                "items": [],
+                "text_layer_pages": sum(1 for page in page_results if page["source"] == "text"),
+                "preprocessing": [
+                    {"page": page["page"], **page["preprocessing"]}
+                    for page in page_results if page.get("preprocessing")
+                ],
+                "page_errors": page_errors,
+                "scores": {}
+            }
+
+        except Exception as e:
+            print(f"Error in PDF processing: {str(e)}")
+            return {
+                "document_type": "PDF",
+                "markdown_content": "",
+                "items": [],
+                "error": str(e)
+            }
+
+    async def parse_pdf_cached(self, document_file: UploadFile, pdf_bytes: bytes) -> Dict[str, Any]:
+        """
+        Parse a PDF through the OCR cache, keyed by the SHA-256 of its bytes and the OCR settings.
+        Identical documents that are being parsed concurrently share a single parse.
+        """
+        document_key = f"pages:{OCR_CACHE_VERSION}:{self.ocr_cache_namespace}:{sha256_hex(pdf_bytes)}"
+        ocr_cache = get_ocr_cache()
+        if ocr_cache:
+            cached_pages = await asyncio.to_thread(ocr_cache.get, document_key)
+            if cached_pages is not None:
+                print(f"OCR cache hit for document: {document_file.filename}")
+                CACHE_HITS.labels("ocr_document").inc()
+                pages = cached_pages.split(PAGE_SEPARATOR)
+                return {
+                    "document_type": "PDF",
+                    "markdown_content": "".join(page + "\n" for page in pages),
+                    "pages": pages,
+                    "items": [],
+                    "page_errors": [],
+                    "cached": True,
+                    "scores": {}
+                }
+
+        if document_key in _inflight_documents:
+            print(f"Waiting for identical document being parsed: {document_file.filename}")
+            return dict(await asyncio.shield(_inflight_documents[document_key]))
+
+        task = asyncio.ensure_future(self.parse_pdf(document_file, pdf_bytes))
+        _inflight_documents[document_key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            _inflight_documents.pop(document_key, None)
+
+        # Only complete documents are cached so failed pages are retried on the next upload
+        if ocr_cache and result.get("markdown_content") and not result.get("error") and not result.get("page_errors"):
+            await asyncio.to_thread(ocr_cache.set, document_key, PAGE_SEPARATOR.join(result["pages"]))
+        return dict(result)
+
     async def parse_document(self, document_file: UploadFile) -> Dict[str, Any]:
         """Parse document (PDF only) into structured data"""
         try:
@@ -76,96 +514,9 @@ class OCRService:
             is_pdf = file_extension == 'pdf' or 'pdf' in content_type.lower()
 
             if is_pdf:
-                print("Processing as PDF document - converting to images")
                 document_file.file.seek(0)
-                try:
-                    images = await self.pdf_to_images(document_file)
-                    print(f"Converted to {len(images)} images")
-                    
-                    if not images:
-                        return {
-                            "document_type": "PDF",
-                            "markdown_content": "",
-                            "items": [],
-                            "error": "No images extracted from PDF",
-                            "scores": {}
-                        }
-                    
-                    all_markdown = ""
-                    for idx, image_file in enumerate(images):
-                        try:
-                            print(f"Processing image {idx + 1}/{len(images)}")
-                            # Get the actual file object from our SimpleFile wrapper
-                            image = image_file['image']
-                            image_data = image.read()  # Read the bytes directly
-                            
-                            # Encode without awaiting
-                            image_base64 = base64.b64encode(image_data).decode("utf-8")
-                            
-                            messages = [
-                                {"role": "system", "content": """
-                                You are an OCR assistant powered by a Vision-Language Model. Your job is to extract text and formatting information from any document, regardless of its format (images, PDFs, handwritten notes, etc.). You must output all extracted content in a well-organized Markdown document.
-                                Key requirements:
-                                Comprehensive Extraction: Capture every bit of text present in the document.
-                                Structured Markdown Output: Organize the extracted text into a structured Markdown format.
-                                Formatting Preservation:
-                                Headers: Convert document headers into Markdown headers (using #, ##, etc.).
-                                Footers: Identify and annotate footers appropriately.
-                                Tables: Recognize tables and render them using Markdown table syntax.
-                                Additional Features: Include lists, bold or italic text, page breaks, and any other formatting cues that can be represented in Markdown.
-                                Detail-Oriented: Ensure that nothing is omitted—extract and present all available information from the document.
-                                Your final output should be a single, structured Markdown document that faithfully represents both the content and the formatting of the original input.
-                                """},
-                                {
-                                    "role": "user",
-                                    "content": [
-                                        {
-                                            "type": "text",
-                                            "text": "Please extract all text and formatting from this image and present it as a well-structured Markdown document."
-                                        },
-                                        {
-                                            "type": "image_url",
-                                            "image_url": {
-                                                "url": f"data:image/jpeg;base64,{image_base64}",
-                                                "detail": "high"
-                                            }
-                                        }
-                                    ]
-                                }
-                            ]
-                            
-                            response = await self.llm_service.generate_vision(messages)
-                            print(f"Got response for image {idx + 1}, length: {len(response)}")
-                            all_markdown += response + "\n"
-                            
-                        except Exception as e:
-                            print(f"Error processing image {idx + 1}: {str(e)}")
-                            continue
-                    
-                    if not all_markdown:
-                        return {
-                            "document_type": "PDF",
-                            "markdown_content": "",
-                            "items": [],
-                            "error": "Failed to extract text from PDF",
-                            "scores": {}
-                        }
-                    
-                    return {
-                        "document_type": "PDF",
-                        "markdown_content": all_markdown,
-                        "items": [],
-                        "scores": {}
-                    }
-                    
-                except Exception as e:
-                    print(f"Error in PDF processing: {str(e)}")
-                    return {
-                        "document_type": "PDF",
-                        "markdown_content": "",
-                        "items": [],
-                        "error": str(e)
-                    }
+                pdf_bytes = await document_file.read()
+                return await self.parse_pdf_cached(document_file, pdf_bytes)
             else:
                 return {
                     "error": "Only PDF files are supported.",
@@ -181,19 +532,8 @@ class OCRService:
                 "items": []
             }
     
-    async def analyze_cvs(
-        self,
-        cv_contents: List[dict],  # Each dict: { "filename": ..., "content": ... }
-        criteria: List[dict],     # Each dict: { "name": ..., "description": ... }
-        job_description: str
-    ) -> List[dict]:
-        """
-        For each CV, get scores for each criterion and a summary of the CV.
-        Returns a list of dicts: { "filename": ..., "scores": ..., "summary": ... }
-        """
-        results = []
-        batch_size = 2  # Process 2 CVs at a time
-        
+    def build_scoring_prompt(self, criteria: List[dict], job_description: str) -> str:
+        """System prompt shared by every CV scored against the same job description and criteria"""
         # Build criteria string for the prompt
         criteria_str = "\n".join(
             f"- {c['name']}: {c['description']}" for c in criteria
@@ -233,95 +573,214 @@ Evaluation Guidelines:
    - Maintain the exact JSON structure provided in the user prompt
 """
 
-        # Process CVs in batches
-        for i in range(0, len(cv_contents), batch_size):
-            batch = cv_contents[i:i + batch_size]
-            batch_results = []
-            
-            for cv in batch:
-                # User prompt
-                user_prompt = f"""Analyze this CV and provide scores for each criterion:
+        return system_prompt
+
+    async def score_cv(
+        self,
+        cv: dict,                 # { "filename": ..., "content": ... }
+        criteria: List[dict],     # Each dict: { "name": ..., "description": ... }
+        job_description: str,
+        system_prompt: Optional[str] = None,
+        use_cache: bool = True
+    ) -> dict:
+        """
+        Score a single CV against the criteria. Failures are returned as a result with an "error"
+        key instead of being raised, so one bad CV never affects the others.
+        """
+        system_prompt = system_prompt or self.build_scoring_prompt(criteria, job_description)
+        if use_cache:
+            cached_result = self.get_cached_score(cv, criteria, job_description)
+            if cached_result is not None:
+                return cached_result
+
+        # User prompt
+        user_prompt = f"""Analyze this CV and provide scores for each criterion:
 
 CV Content:
 {cv['content']}
 
 Extract the candidate's name (use 'N/A' if not found) and provide scores with explanations."""
 
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "system", "content": """You are a JSON-first assistant. Always respond with valid JSON that follows this exact structure:
-{
-    "candidate": "string",
-    "scores": {
-        "<criterion_name>": {
-            "score": number,
-            "explanation": "string"
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SCORING_JSON_FORMAT_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        try:
+            response = await self.llm_service.generate_json(messages, build_scores_schema(criteria), name="cv_scores")
+            print(f"Raw LLM response for {cv['filename']}: {response}")  # Add logging
+            result = parse_json_response(response)
+            if not isinstance(result, dict):
+                raise ValueError("Expected a JSON object")
+            result = await self.complete_scores(cv, result, criteria, job_description)
+            # Incomplete results are not cached so the missing criteria are requested again next time
+            if not result.get("missing_criteria"):
+                self.cache_score(cv, criteria, job_description, result)
+            return {
+                "filename": cv["filename"],
+                **result
+            }
+        except Exception as e:
+            print(f"Error processing CV {cv['filename']}: {str(e)}")
+            return {
+                "filename": cv["filename"],
+                "error": f"Failed to process CV: {str(e)}",
+                "scores": {},
+                "candidate": "Unknown",
+                "summary": ""
+            }
+
+    async def score_criteria(self, cv: dict, criteria: List[dict], job_description: str) -> dict:
+        """Request scores for only the given criteria of a CV; returns the (unvalidated) scores dict"""
+        system_prompt = self.build_scoring_prompt(criteria, job_description)
+        user_prompt = f"""Score this CV against the listed criteria only:
+
+CV Content:
+{cv['content']}
+
+Provide a score with an explanation for each of these criteria: {", ".join(c["name"] for c in criteria)}."""
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SCORING_JSON_FORMAT_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+        response = await self.llm_service.generate_json(
+            messages, build_scores_schema(criteria, scores_only=True), name="cv_criterion_scores"
+        )
+        result = parse_json_response(response)
+        return result.get("scores", {}) if isinstance(result, dict) else {}
+
+    async def complete_scores(self, cv: dict, result: dict, criteria: List[dict], job_description: str) -> dict:
+        """
+        Validate a scoring result against the criteria and re-request only the criteria that are
+        missing or malformed, up to SCORING_REPAIR_ATTEMPTS times. Criteria that are still missing
+        afterwards are listed under "missing_criteria".
+        """
+        scores, missing = validate_scores(result.get("scores"), criteria)
+        for _ in range(SCORING_REPAIR_ATTEMPTS):
+            if not missing:
+                break
+            print(f"Re-requesting {len(missing)} criteria for CV {cv['filename']}: {[c['name'] for c in missing]}")
+            try:
+                repaired_scores, missing = validate_scores(await self.score_criteria(cv, missing, job_description), missing)
+                scores.update(repaired_scores)
+            except Exception as e:
+                print(f"Error re-requesting criteria for CV {cv['filename']}: {str(e)}")
+
+        completed = {
+            **result,
+            "candidate": result.get("candidate") if isinstance(result.get("candidate"), str) else "N/A",
+            "summary": result.get("summary") if isinstance(result.get("summary"), str) else "",
+            # Keep the order of the criteria list
+            "scores": {c["name"]: scores[c["name"]] for c in criteria if c["name"] in scores}
         }
-    },
-    "summary": "string"
-}
+        if missing:
+            completed["missing_criteria"] = [c["name"] for c in missing]
+        return completed
 
-Example with multiple criteria:
-{
-    "candidate": "John Doe",
-    "scores": {
-        "Criterion 1": {
-            "score": 8.5,
-            "explanation": "Strong proficiency in required technologies"
-        },
-        "Criterion 2": {
-            "score": 7.0,
-            "explanation": "Relevant work history in the field"
-        },
-        "Criterion 3": {
-            "score": 9.0,
-            "explanation": "Excellent academic background"
+    def get_cached_score(self, cv: dict, criteria: List[dict], job_description: str) -> Optional[dict]:
+        """Result of an identical earlier scoring run, if any"""
+        if not SCORING_CACHE_ENABLED:
+            return None
+        cached_result = scoring_cache.get(scoring_cache_key(cv["content"], job_description, criteria, self.llm_service.model_name))
+        if cached_result is None:
+            return None
+        print(f"Scoring cache hit for CV {cv['filename']}")
+        CACHE_HITS.labels("scoring").inc()
+        return {
+            "filename": cv["filename"],
+            **copy.deepcopy(cached_result)
         }
-    },
-    "summary": "John Doe is a qualified candidate with strong technical skills and relevant experience..."
-}
 
-Rules:
-1. All objects must be properly closed
-2. Use double quotes for strings
-3. Use numbers (not strings) for scores
-4. No trailing commas
-5. No comments or markdown formatting
-6. Use the exact criterion names provided in the criteria list
-7. Include ALL criteria from the provided list"""},
-                    {"role": "user", "content": user_prompt}
-                ]
+    def cache_score(self, cv: dict, criteria: List[dict], job_description: str, result: dict) -> None:
+        if SCORING_CACHE_ENABLED:
+            cache_key = scoring_cache_key(cv["content"], job_description, criteria, self.llm_service.model_name)
+            scoring_cache.set(cache_key, copy.deepcopy(result))
 
-                try:
-                    response = await self.llm_service.generate_response(messages)
-                    # Clean up and parse response
-                    response = response.strip()
-                    print(f"Raw LLM response for {cv['filename']}: {response}")  # Add logging
-                    if response.startswith("```json"):
-                        response = response[7:]
-                    if response.startswith("```"):
-                        response = response[3:]
-                    if response.endswith("```"):
-                        response = response[:-3]
-                    response = response.strip()
-                    print(f"Cleaned response for {cv['filename']}: {response}")  # Add logging
-                    
-                    result = json.loads(response)
-                    batch_results.append({
-                        "filename": cv["filename"],
-                        **result
-                    })
-                except Exception as e:
-                    print(f"Error processing CV {cv['filename']}: {str(e)}")
-                    batch_results.append({
-                        "filename": cv["filename"],
-                        "error": f"Failed to process CV: {str(e)}",
-                        "scores": {},
-                        "candidate": "Unknown",
-                        "summary": ""
-                    })
-            
-            results.extend(batch_results)
-            
+    async def score_cv_batch(
+        self,
+        cvs: List[dict],          # Each dict: { "filename": ..., "content": ... }, filenames unique
+        criteria: List[dict],
+        job_description: str,
+        system_prompt: Optional[str] = None,
+        use_cache: bool = True
+    ) -> List[dict]:
+        """
+        Score several CVs with a single LLM call, so the system prompt, job description and criteria
+        are only sent once. If the response cannot be parsed, or CVs are missing from it, those CVs
+        are scored individually. Returns the results in input order.
+        """
+        system_prompt = system_prompt or self.build_scoring_prompt(criteria, job_description)
+        results: List[Optional[dict]] = [None] * len(cvs)
+        to_score = []
+        for index, cv in enumerate(cvs):
+            cached_result = self.get_cached_score(cv, criteria, job_description) if use_cache else None
+            if cached_result is not None:
+                results[index] = cached_result
+            else:
+                to_score.append((index, cv))
+
+        if len(to_score) == 1:
+            index, cv = to_score[0]
+            results[index] = await self.score_cv(cv, criteria, job_description, system_prompt, use_cache=False)
+            return results
+        if not to_score:
+            return results
+
+        cv_blocks = "\n\n".join(
+            f"=== CV file: {cv['filename']} ===\n{cv['content']}" for _, cv in to_score
+        )
+        user_prompt = f"""Analyze these {len(to_score)} CVs and provide scores for each criterion for every CV:
+
+{cv_blocks}
+
+For each CV, extract the candidate's name (use 'N/A' if not found) and provide scores with explanations."""
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": BATCH_SCORING_JSON_FORMAT_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        entries_by_filename = {}
+        try:
+            response = await self.llm_service.generate_response(messages)
+            entries = parse_json_response(response)
+            if not isinstance(entries, list):
+                raise ValueError("Expected a JSON array of CV results")
+            entries_by_filename = {
+                entry.get("filename"): entry for entry in entries if isinstance(entry, dict)
+            }
+        except Exception as e:
+            print(f"Batched scoring of {len(to_score)} CVs failed, scoring them individually: {str(e)}")
+
+        answered = []
+        retry = []
+        for index, cv in to_score:
+            entry = entries_by_filename.get(cv["filename"])
+            if entry is None or not isinstance(entry.get("scores"), dict):
+                retry.append((index, cv))
+            else:
+                answered.append((index, cv, {key: value for key, value in entry.items() if key != "filename"}))
+
+        async def complete(cv: dict, result: dict) -> dict:
+            result = await self.complete_scores(cv, result, criteria, job_description)
+            if not result.get("missing_criteria"):
+                self.cache_score(cv, criteria, job_description, result)
+            return {
+                "filename": cv["filename"],
+                **result
+            }
+
+        if retry:
+            print(f"Scoring {len(retry)} of {len(to_score)} batched CVs individually")
+        # Incomplete CVs are repaired, and unanswered ones scored, concurrently rather than one LLM call after another
+        completed = await asyncio.gather(
+            *(complete(cv, result) for _, cv, result in answered),
+            *(self.score_cv(cv, criteria, job_description, system_prompt, use_cache=False) for _, cv in retry)
+        )
+        for (index, *_), result in zip(answered + retry, completed):
+            results[index] = result
         return results
-    
@@ -0,0 +1,128 @@
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Record a timing profile of every analysis and store it with its JobAnalysis
+TIMING_PROFILE_ENABLED = os.getenv("TIMING_PROFILE_ENABLED", "true").lower() == "true"
+# Bump when the shape of the stored profile changes
+TIMING_PROFILE_VERSION = 1
+
+# Trace of the file (or scoring batch) the current task works on; tasks started from it inherit it,
+# so page OCR tasks and LLM retries deep in the pipeline are recorded without passing it around
+_current_trace: ContextVar[Optional[dict]] = ContextVar("analysis_trace", default=None)
+
+def current_trace() -> Optional[dict]:
+    return _current_trace.get()
+
+@contextmanager
+def tracing(trace: Optional[dict]):
+    """Make `trace` the current trace of this task and of the tasks it starts"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+def page_trace(page: int) -> Optional[dict]:
+    """Timings of a page of the current file, created on first use"""
+    trace = current_trace()
+    if trace is None or "page_timings" not in trace:
+        return None
+    for entry in trace["page_timings"]:
+        if entry["page"] == page:
+            return entry
+    entry = {"page": page, "rasterize_seconds": None, "ocr_seconds": None, "cached": False}
+    trace["page_timings"].append(entry)
+    return entry
+
+def record_retry() -> None:
+    """Count a retried LLM request against the current trace"""
+    trace = current_trace()
+    if trace is not None:
+        trace["retries"] += 1
+
+def db_timer(profile: Optional["AnalysisProfile"]):
+    """Context manager adding its duration to the database time of `profile`, if any"""
+    return profile.db() if profile else nullcontext()
+
+def rounded(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds, 3) if seconds is not None else None
+
+class AnalysisProfile:
+    """
+    Timing trace of one analysis: per file page count, rasterize and OCR time per page,
+    scoring time and retries, plus the batches of batched scoring and the time spent in the database.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.files: Dict[int, dict] = {}
+        self.batches: List[dict] = []
+        self.db_seconds = 0.0
+
+    def file(self, index: int, filename: str) -> dict:
+        trace = {
+            "filename": filename,
+            "pages": 0,
+            "text_layer_pages": 0,
+            "cached": False,
+            "queued_seconds": None,
+            "parse_seconds": None,
+            "page_timings": [],
+            "scoring_seconds": None,
+            "batched": False,
+            "retries": 0,
+            "error": None
+        }
+        self.files[index] = trace
+        return trace
+
+    def batch(self, filenames: List[str]) -> dict:
+        trace = {"filenames": filenames, "scoring_seconds": None, "retries": 0}
+        self.batches.append(trace)
+        return trace
+
+    @contextmanager
+    def db(self):
+        """Add the time spent in the block to the database time"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.db_seconds += time.perf_counter() - started_at
+
+    def file_summary(self, trace: dict) -> dict:
+        page_timings = sorted(trace["page_timings"], key=lambda entry: entry["page"])
+        return {
+            **trace,
+            "queued_seconds": rounded(trace["queued_seconds"]),
+            "parse_seconds": rounded(trace["parse_seconds"]),
+            "rasterize_seconds": rounded(sum(entry["rasterize_seconds"] or 0 for entry in page_timings)),
+            "ocr_seconds": rounded(sum(entry["ocr_seconds"] or 0 for entry in page_timings)),
+            "page_timings": [
+                {
+                    **entry,
+                    "rasterize_seconds": rounded(entry["rasterize_seconds"]),
+                    "ocr_seconds": rounded(entry["ocr_seconds"])
+                }
+                for entry in page_timings
+            ],
+            "scoring_seconds": rounded(trace["scoring_seconds"])
+        }
+
+    def to_dict(self) -> dict:
+        """JSON-serializable profile, as stored in JobAnalysis.timing_profile"""
+        files = [self.file_summary(self.files[index]) for index in sorted(self.files)]
+        batches = [{**batch, "scoring_seconds": rounded(batch["scoring_seconds"])} for batch in self.batches]
+        return {
+            "version": TIMING_PROFILE_VERSION,
+            "total_seconds": rounded(time.perf_counter() - self.started_at),
+            "db_seconds": rounded(self.db_seconds),
+            "files": len(files),
+            "pages": sum(trace["pages"] for trace in files),
+            "retries": sum(trace["retries"] for trace in files) + sum(batch["retries"] for batch in batches),
+            "file_timings": files,
+            "batches": batches
+        }
@@ -0,0 +1,193 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+from PIL import Image, ImageChops
+
+RASTERIZE_DPI = int(os.getenv("RASTERIZE_DPI", "200"))
+# Page image preprocessing before vision calls; cropping and downscaling change the image the model sees, so they are opt-in
+PREPROCESS_DOWNSCALE = os.getenv("PREPROCESS_DOWNSCALE", "false").lower() == "true"
+PREPROCESS_GRAYSCALE = os.getenv("PREPROCESS_GRAYSCALE", "false").lower() == "true"
+PREPROCESS_CROP_MARGINS = os.getenv("PREPROCESS_CROP_MARGINS", "false").lower() == "true"
+PREPROCESS_JPEG_QUALITY = int(os.getenv("PREPROCESS_JPEG_QUALITY", "75"))
+# Detail level requested from the vision model ("high", "low" or "auto")
+OCR_IMAGE_DETAIL = os.getenv("OCR_IMAGE_DETAIL", "high")
+# Encode the unprocessed page as well to report the bytes saved (costs one extra JPEG encoding per page)
+PREPROCESS_REPORT_SAVINGS = os.getenv("PREPROCESS_REPORT_SAVINGS", "false").lower() == "true"
+
+# Largest image each provider looks at: (max long side, max short side) in pixels.
+# Anything larger is downscaled by the provider anyway, so sending it only costs upload time.
+PROVIDER_IMAGE_LIMITS = {
+    "openai": (2048, 768),
+    "google": (3072, 3072),
+}
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    """How a page is turned into the image sent to the vision model"""
+    dpi: int = RASTERIZE_DPI
+    provider: str = "openai"
+    downscale: bool = PREPROCESS_DOWNSCALE
+    grayscale: bool = PREPROCESS_GRAYSCALE
+    crop_margins: bool = PREPROCESS_CROP_MARGINS
+    jpeg_quality: int = PREPROCESS_JPEG_QUALITY
+    detail: str = OCR_IMAGE_DETAIL
+    report_savings: bool = PREPROCESS_REPORT_SAVINGS
+
+def estimate_image_tokens(width: int, height: int, provider: str, detail: str = "high") -> int:
+    """Approximate number of input tokens a provider bills for an image of the given size"""
+    if provider == "google":
+        # Small images are a single tile, larger ones are cropped into 768x768 tiles
+        if width <= 384 and height <= 384:
+            return 258
+        return 258 * math.ceil(width / 768) * math.ceil(height / 768)
+    if detail == "low":
+        return 85
+    # OpenAI "high" detail: fit within 2048x2048, scale the short side to 768, then count 512px tiles
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+def crop_margins(image: Image.Image, threshold: int = 16, padding: int = 12) -> Image.Image:
+    """Crop the near-white border around the page content"""
+    background = Image.new(image.mode, image.size, (255,) * len(image.getbands()))
+    diff = ImageChops.difference(image, background).convert("L")
+    bbox = diff.point(lambda value: 255 if value > threshold else 0).getbbox()
+    if not bbox:
+        return image
+    left, top, right, bottom = bbox
+    return image.crop((
+        max(0, left - padding),
+        max(0, top - padding),
+        min(image.width, right + padding),
+        min(image.height, bottom + padding)
+    ))
+
+def downscale(image: Image.Image, provider: str) -> Image.Image:
+    """Shrink an image to the largest size the provider actually uses"""
+    max_long, max_short = PROVIDER_IMAGE_LIMITS.get(provider, PROVIDER_IMAGE_LIMITS["openai"])
+    long_side, short_side = max(image.size), min(image.size)
+    scale = min(1.0, max_long / long_side, max_short / short_side)
+    if scale >= 1.0:
+        return image
+    return image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+
+def encode_jpeg(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def preprocess_page(image: Image.Image, options: PreprocessOptions) -> dict:
+    """
+    Apply the preprocessing options to a rendered page and encode it as JPEG.
+    Returns { 'image': <JPEG bytes>, 'width': ..., 'height': ..., 'stats': {...} } where
+    stats compare the processed page with the unprocessed one.
+    """
+    original_size = image.size
+    original_bytes = len(encode_jpeg(image, 75)) if options.report_savings else None
+
+    if options.crop_margins:
+        image = crop_margins(image)
+    if options.grayscale:
+        image = image.convert("L")
+    if options.downscale:
+        image = downscale(image, options.provider)
+    data = encode_jpeg(image, options.jpeg_quality)
+
+    # The unprocessed baseline is what was sent before preprocessing existed: full page, "high" detail
+    original_tokens = estimate_image_tokens(*original_size, options.provider)
+    tokens = estimate_image_tokens(*image.size, options.provider, options.detail)
+    return {
+        "image": data,
+        "width": image.width,
+        "height": image.height,
+        "stats": {
+            "original_size": list(original_size),
+            "size": [image.width, image.height],
+            "original_bytes": original_bytes,
+            "bytes": len(data),
+            "bytes_saved": original_bytes - len(data) if original_bytes is not None else None,
+            "original_tokens": original_tokens,
+            "tokens": tokens,
+            "tokens_saved": original_tokens - tokens
+        }
+    }
+
+def available_cpus() -> int:
+    """Number of cores this process may use, honouring CPU affinity and the container's cgroup quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+# Number of worker processes used for rasterization and image encoding (0 = one per available core)
+RASTERIZE_WORKERS = int(os.getenv("RASTERIZE_WORKERS", "0")) or available_cpus()
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pool_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_executor() -> ProcessPoolExecutor:
+    """Process pool shared by all requests; workers are spawned so they do not inherit the event loop's threads"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=RASTERIZE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+async def run_in_pool(func, *args):
+    """
+    Run a CPU-bound function in the process pool without blocking the event loop.
+    At most two jobs per worker are queued so large batches do not pile up PDF bytes in memory.
+    """
+    global _pool_semaphore
+    if _pool_semaphore is None:
+        _pool_semaphore = asyncio.Semaphore(RASTERIZE_WORKERS * 2)
+    async with _pool_semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), func, *args)
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def pdf_page_count(pdf_bytes: bytes) -> int:
+    """Number of pages of a PDF"""
+    return int(pdfinfo_from_bytes(pdf_bytes)["Pages"])
+
+def render_page(pdf_bytes: bytes, page: int, options: Optional[PreprocessOptions] = None) -> dict:
+    """
+    Rasterize a single 1-based page of a PDF, entirely in memory, and preprocess it for the vision model.
+    Returns the dict produced by preprocess_page, with the time spent under stats["render_seconds"].
+    """
+    started_at = time.perf_counter()
+    options = options or PreprocessOptions()
+    images = convert_from_bytes(pdf_bytes, dpi=options.dpi, first_page=page, last_page=page)
+    if not images:
+        raise ValueError(f"Page {page} could not be rasterized")
+    image = images[0]
+    try:
+        rendered = preprocess_page(image.convert("RGB"), options)
+    finally:
+        image.close()
+    rendered["stats"]["render_seconds"] = time.perf_counter() - started_at
+    return rendered
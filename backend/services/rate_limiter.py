@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from .metrics import LLM_CALLS, LLM_FAILURES, LLM_RETRIES
+from .profiling import record_retry
+
+logger = logging.getLogger(__name__)
+
+# Provider rate limits, applied per model: requests and tokens per minute
+PROVIDER_RATE_LIMITS = {
+    "openai": (
+        int(os.getenv("OPENAI_RPM", "500")),
+        int(os.getenv("OPENAI_TPM", "200000"))
+    ),
+    "google": (
+        int(os.getenv("GOOGLE_RPM", "1000")),
+        int(os.getenv("GOOGLE_TPM", "1000000"))
+    )
+}
+# In-flight requests per model: starting point and bounds of the adaptive limit
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+# Responses slower than this (seconds) shrink the concurrency limit slightly
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "30"))
+# Retries of rate limited, timed out and failed (5xx) requests, with jittered exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+
+# Token estimates used to charge the tokens-per-minute bucket before a request is sent
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = int(os.getenv("LLM_IMAGE_TOKENS_ESTIMATE", "1000"))
+OUTPUT_TOKENS = int(os.getenv("LLM_OUTPUT_TOKENS_ESTIMATE", "1000"))
+
+RATE_LIMIT_ERRORS = {"RateLimitError", "ResourceExhausted", "TooManyRequests"}
+TRANSIENT_ERRORS = {
+    "APITimeoutError", "APIConnectionError", "InternalServerError", "ServiceUnavailable",
+    "DeadlineExceeded", "TimeoutException", "TimeoutError", "ConnectError"
+}
+
+def estimate_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Approximate input plus output tokens of a chat request, counting images at a flat rate"""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                chars += len(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                images += 1
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS + OUTPUT_TOKENS
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status of an OpenAI (status_code) or Google API (code) error, if any"""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+def is_rate_limited(error: Exception) -> bool:
+    return type(error).__name__ in RATE_LIMIT_ERRORS or error_status(error) == 429
+
+def is_transient(error: Exception) -> bool:
+    status = error_status(error)
+    return type(error).__name__ in TRANSIENT_ERRORS or (status is not None and status >= 500)
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Delay requested by the provider through a Retry-After header"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """
+    Refills `rate_per_minute` units per minute up to one minute's worth.
+    Callers wait in turn until enough units are available.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+class AIMDLimiter:
+    """
+    Concurrency limit that grows by one per window of successful requests (additive increase)
+    and halves on rate limiting (multiplicative decrease). Slow responses shrink it by 10%.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+        self.last_decrease = 0.0
+
+    async def acquire(self) -> None:
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self, started_at: float) -> None:
+        if time.monotonic() - started_at > LLM_LATENCY_TARGET:
+            self._decrease(0.9, started_at)
+        elif self.in_flight >= int(self.limit):
+            # Only grow while the current limit is actually used
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_rate_limited(self, started_at: float) -> None:
+        self._decrease(0.5, started_at)
+
+    def _decrease(self, factor: float, started_at: float) -> None:
+        # Requests sent before the last decrease fail together; they count as a single congestion signal
+        if started_at < self.last_decrease:
+            return
+        self.last_decrease = time.monotonic()
+        self.limit = max(self.minimum, self.limit * factor)
+
+class RateLimitScheduler:
+    """Paces the requests to one provider model: RPM and TPM token buckets, AIMD concurrency and retries"""
+
+    def __init__(self, provider: str, model: str, requests_per_minute: int, tokens_per_minute: int):
+        self.name = f"{provider}/{model}"
+        self.provider = provider
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AIMDLimiter(LLM_INITIAL_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY)
+
+    async def run(self, call: Callable[[], Awaitable[Any]], estimated_tokens: int = OUTPUT_TOKENS) -> Any:
+        """Run `call` once capacity is available, retrying rate limited and transient failures"""
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self.concurrency.acquire()
+            started_at = time.monotonic()
+            try:
+                await self.requests.acquire(1)
+                await self.tokens.acquire(estimated_tokens)
+                started_at = time.monotonic()
+                LLM_CALLS.labels(self.provider, self.model).inc()
+                result = await call()
+                self.concurrency.on_success(started_at)
+                return result
+            except Exception as e:
+                LLM_FAILURES.labels(self.provider, self.model).inc()
+                rate_limited = is_rate_limited(e)
+                if attempt == LLM_MAX_RETRIES or not (rate_limited or is_transient(e)):
+                    raise
+                LLM_RETRIES.labels(self.provider, self.model).inc()
+                record_retry()
+                if rate_limited:
+                    self.concurrency.on_rate_limited(started_at)
+                # Full jitter so retries of requests that failed together do not collide again
+                backoff = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt)
+                delay = min(LLM_BACKOFF_MAX, retry_after(e) or random.uniform(0, backoff))
+                logger.warning(
+                    f"{self.name} request failed ({type(e).__name__}), retry {attempt + 1}/{LLM_MAX_RETRIES} "
+                    f"in {delay:.1f}s, concurrency limit {int(self.concurrency.limit)}"
+                )
+            finally:
+                await self.concurrency.release()
+            await asyncio.sleep(delay)
+
+_schedulers: Dict[Tuple[str, str], RateLimitScheduler] = {}
+
+def get_scheduler(provider: str, model: str) -> RateLimitScheduler:
+    """Scheduler shared by every request to the same provider model"""
+    key = (provider, model)
+    if key not in _schedulers:
+        requests_per_minute, tokens_per_minute = PROVIDER_RATE_LIMITS.get(provider, (600, 1000000))
+        _schedulers[key] = RateLimitScheduler(provider, model, requests_per_minute, tokens_per_minute)
+    return _schedulers[key]
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Awaitable, BinaryIO, Callable, Dict, Iterator, List, Optional
+from .cache import DiskLRUCache
+from .metrics import CACHE_HITS
+from .generatePDF import create_candidates_pdf, merge_pdfs, render_candidates_shard, render_title_page
+from .rasterizer import RASTERIZE_WORKERS, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+# Rendered PDF reports keyed by job analysis; results no longer change once an analysis is completed
+REPORT_CACHE_ENABLED = os.getenv("REPORT_CACHE_ENABLED", "true").lower() == "true"
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", ".cache/reports")
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Bump to invalidate cached reports, e.g. after changing the report layout
+REPORT_VERSION = os.getenv("REPORT_VERSION", "1")
+# Reports are streamed to the client in chunks of this size
+REPORT_CHUNK_SIZE = int(os.getenv("REPORT_CHUNK_SIZE", str(64 * 1024)))
+# Reports with at least this many candidates are rendered in shards across the process pool
+REPORT_PARALLEL_MIN_CANDIDATES = int(os.getenv("REPORT_PARALLEL_MIN_CANDIDATES", "50"))
+# Maximum number of candidates rendered by one worker task
+REPORT_SHARD_SIZE = int(os.getenv("REPORT_SHARD_SIZE", "25"))
+# Attempts to open a cached report, which can be evicted between looking it up and opening it
+REPORT_OPEN_ATTEMPTS = 3
+
+CandidatesLoader = Callable[[], Awaitable[List[dict]]]
+
+_report_cache: Optional[DiskLRUCache] = None
+
+def get_report_cache() -> Optional[DiskLRUCache]:
+    """Shared report cache, or None if caching is disabled"""
+    global _report_cache
+    if REPORT_CACHE_ENABLED and _report_cache is None:
+        _report_cache = DiskLRUCache(REPORT_CACHE_DIR, REPORT_CACHE_MAX_BYTES, extension=".pdf")
+    return _report_cache
+
+def report_key(job_analysis_id) -> str:
+    return f"report:{REPORT_VERSION}:{job_analysis_id.hex}"
+
+def report_etag(job_analysis_id) -> str:
+    return f'"{REPORT_VERSION}-{job_analysis_id.hex}"'
+
+def shard_candidates(candidates: List[dict], workers: int) -> List[List[dict]]:
+    """Split candidates into consecutive slices, at least one per worker and at most REPORT_SHARD_SIZE long"""
+    shard_size = max(1, min(REPORT_SHARD_SIZE, -(-len(candidates) // workers)))
+    return [candidates[i:i + shard_size] for i in range(0, len(candidates), shard_size)]
+
+async def render_report(candidates: List[dict], output, generated_at: Optional[datetime] = None) -> None:
+    """
+    Render a report into `output` (a file path or file object) without blocking the event loop.
+    Large reports are drawn in shards by the process pool and merged in order behind the title page.
+    """
+    if len(candidates) < REPORT_PARALLEL_MIN_CANDIDATES or RASTERIZE_WORKERS < 2:
+        await asyncio.to_thread(create_candidates_pdf, candidates, output, generated_at)
+        return
+
+    shards = shard_candidates(candidates, RASTERIZE_WORKERS)
+    logger.info(f"Rendering report of {len(candidates)} candidates in {len(shards)} shards")
+    parts = await asyncio.gather(
+        run_in_pool(render_title_page, generated_at),
+        *[run_in_pool(render_candidates_shard, shard) for shard in shards]
+    )
+    await asyncio.to_thread(merge_pdfs, parts, output)
+
+# Reports currently being rendered, keyed by cache key, so concurrent downloads render once
+_inflight_reports: Dict[str, asyncio.Future] = {}
+
+async def render_cached_report(
+    cache: DiskLRUCache,
+    key: str,
+    load_candidates: CandidatesLoader,
+    generated_at: Optional[datetime]
+) -> str:
+    """Render a report into the cache; returns the cached file path"""
+    candidates = await load_candidates()
+    temp_path = cache.temp_path(key)
+    try:
+        await render_report(candidates, temp_path, generated_at)
+        return await asyncio.to_thread(cache.add_file, key, temp_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+async def cached_report_path(
+    cache: DiskLRUCache,
+    key: str,
+    job_analysis_id,
+    load_candidates: CandidatesLoader,
+    generated_at: Optional[datetime]
+) -> str:
+    """Path of the cached report, rendering it (once for concurrent callers) on a miss"""
+    path = await asyncio.to_thread(cache.get_path, key)
+    if path:
+        logger.info(f"Report cache hit for job analysis {job_analysis_id}")
+        CACHE_HITS.labels("report").inc()
+        return path
+    if key in _inflight_reports:
+        return await asyncio.shield(_inflight_reports[key])
+    task = asyncio.ensure_future(render_cached_report(cache, key, load_candidates, generated_at))
+    _inflight_reports[key] = task
+    try:
+        return await asyncio.shield(task)
+    finally:
+        _inflight_reports.pop(key, None)
+
+async def open_report(
+    job_analysis_id,
+    load_candidates: CandidatesLoader,
+    generated_at: Optional[datetime] = None
+) -> BinaryIO:
+    """
+    Open the PDF report of a job analysis for reading, rendering it on a cache miss.
+    The returned file is owned by the caller (see `iter_report`).
+    """
+    cache = get_report_cache()
+    if not cache:
+        report = tempfile.TemporaryFile()
+        try:
+            candidates = await load_candidates()
+            await render_report(candidates, report, generated_at)
+        except Exception:
+            report.close()
+            raise
+        report.seek(0)
+        return report
+
+    key = report_key(job_analysis_id)
+    for attempt in range(REPORT_OPEN_ATTEMPTS):
+        path = await cached_report_path(cache, key, job_analysis_id, load_candidates, generated_at)
+        try:
+            # An open handle keeps the file readable even if it is evicted while streaming
+            return open(path, "rb")
+        except FileNotFoundError:
+            if attempt == REPORT_OPEN_ATTEMPTS - 1:
+                raise
+            logger.info(f"Cached report of job analysis {job_analysis_id} was evicted before it was opened, rendering it again")
+
+def iter_report(report: BinaryIO) -> Iterator[bytes]:
+    """Stream an opened report in chunks and close it afterwards"""
+    try:
+        while True:
+            chunk = report.read(REPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        report.close()
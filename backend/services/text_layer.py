@@ -0,0 +1,74 @@
+import os
+import re
+import subprocess
+from tempfile import NamedTemporaryFile
+from typing import List
+from pdf2image import pdfinfo_from_path
+
+# Pages whose embedded text is shorter than this are sent to vision OCR instead
+TEXT_LAYER_MIN_CHARS = int(os.getenv("TEXT_LAYER_MIN_CHARS", "200"))
+# Share of letters/digits below which a text layer is considered garbled (e.g. broken font encodings)
+TEXT_LAYER_MIN_ALNUM_RATIO = float(os.getenv("TEXT_LAYER_MIN_ALNUM_RATIO", "0.5"))
+TEXT_LAYER_ENABLED = os.getenv("TEXT_LAYER_ENABLED", "true").lower() == "true"
+
+BULLET_PATTERN = re.compile(r"^\s*[•●▪◦‣■□➢►✓\-\*–]\s+")
+NUMBERED_PATTERN = re.compile(r"^\s*(\d+)[.)]\s+")
+
+def extract_text_layer(pdf_bytes: bytes) -> List[str]:
+    """
+    Extract the embedded text of every page with poppler's pdftotext.
+    Returns one string per page; pages without a text layer are empty strings.
+    """
+    with NamedTemporaryFile(suffix=".pdf") as temp_pdf:
+        temp_pdf.write(pdf_bytes)
+        temp_pdf.flush()
+        page_count = int(pdfinfo_from_path(temp_pdf.name)["Pages"])
+        result = subprocess.run(
+            ["pdftotext", "-enc", "UTF-8", temp_pdf.name, "-"],
+            capture_output=True,
+            check=True,
+            timeout=60
+        )
+    # pdftotext terminates every page with a form feed
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")[:page_count]
+    return pages + [""] * (page_count - len(pages))
+
+def is_sparse(text: str) -> bool:
+    """Whether a page's text layer is missing or too poor to replace vision OCR"""
+    content = "".join(text.split())
+    if len(content) < TEXT_LAYER_MIN_CHARS:
+        return True
+    alnum = sum(1 for char in content if char.isalnum())
+    return alnum / len(content) < TEXT_LAYER_MIN_ALNUM_RATIO or "�" in content
+
+def is_heading(line: str) -> bool:
+    """Short all-caps lines (e.g. "WORK EXPERIENCE") are treated as section headers"""
+    letters = [char for char in line if char.isalpha()]
+    return (
+        len(line) <= 40
+        and len(letters) >= 3
+        and all(char.isupper() for char in letters)
+        and not line.endswith((".", ",", ";"))
+    )
+
+def text_to_markdown(text: str) -> str:
+    """Convert the plain text of a page to markdown: headers, bullet lists and paragraphs"""
+    markdown_lines = []
+    for raw_line in text.splitlines():
+        line = " ".join(raw_line.split())
+        if not line:
+            # Collapse runs of blank lines into a single paragraph break
+            if markdown_lines and markdown_lines[-1]:
+                markdown_lines.append("")
+            continue
+        if BULLET_PATTERN.match(line):
+            line = BULLET_PATTERN.sub("- ", line)
+        elif NUMBERED_PATTERN.match(line):
+            line = NUMBERED_PATTERN.sub(r"\1. ", line)
+        elif is_heading(line):
+            if markdown_lines and markdown_lines[-1]:
+                markdown_lines.append("")
+            markdown_lines.extend([f"## {line.title()}", ""])
+            continue
+        markdown_lines.append(line)
+    return "\n".join(markdown_lines).strip()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The modules under test are imported from the backend directory, as the server runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py creates its engine on import; point it at a throwaway SQLite file
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
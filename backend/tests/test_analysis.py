@@ -0,0 +1,40 @@
+import asyncio
+import io
+from fastapi import UploadFile
+from services.analysis import analyze_files
+
+class StubOCRService:
+    """Parses CV 0 right away and the others slowly, and scores every CV instantly"""
+
+    class llm_service:
+        provider = "openai"
+
+    def build_scoring_prompt(self, criteria, job_description):
+        return "prompt"
+
+    async def parse_document(self, file):
+        if file.filename != "cv_0.pdf":
+            await asyncio.sleep(0.05)
+        return {"markdown_content": f"Text of {file.filename}", "pages": [f"Text of {file.filename}"]}
+
+    async def score_cv(self, cv, criteria, job_description, system_prompt=None, use_cache=True):
+        return {"filename": cv["filename"], "candidate": "A", "summary": "", "scores": {}}
+
+async def run_failing_analysis(events):
+    async def on_event(event, index, data):
+        events.append((event, index))
+        if index == 0:
+            raise RuntimeError("Progress commit failed")
+
+    files = [UploadFile(file=io.BytesIO(b""), filename=f"cv_{i}.pdf") for i in range(3)]
+    try:
+        await analyze_files(StubOCRService(), files, [], "Job", on_event=on_event, batch_scoring=False)
+    except RuntimeError:
+        events.append(("failed", None))
+    # Anything still running would report its progress by now
+    await asyncio.sleep(0.1)
+
+def test_failure_stops_the_other_cvs_before_it_is_raised():
+    events = []
+    asyncio.run(run_failing_analysis(events))
+    assert events == [("parsed", 0), ("failed", None)]
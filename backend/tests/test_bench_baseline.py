@@ -0,0 +1,26 @@
+from benchmarks.bench_analyze_cvs import check_thresholds, compare_with_baseline
+
+def result(**metrics):
+    return {
+        "cvs_per_minute": 100.0, "p95": 10.0, "p99": 12.0, "peak_rss_mb": 300.0,
+        "peak_worker_rss_mb": 200.0, "failed_cvs": 0, **metrics
+    }
+
+def test_results_within_tolerance_pass():
+    baseline = {"results": {"10": result()}}
+    assert compare_with_baseline({"10": result(cvs_per_minute=90.0, p95=11.5)}, baseline, 20) == []
+
+def test_regressions_are_reported():
+    baseline = {"results": {"10": result(), "100": result()}}
+    regressions = compare_with_baseline({"10": result(cvs_per_minute=70.0, peak_rss_mb=400.0)}, baseline, 20)
+    assert len(regressions) == 3
+    assert regressions[0].startswith("10 CVs: cvs_per_minute")
+    assert regressions[-1] == "100 CVs: run failed or was not run"
+
+def test_thresholds():
+    results = {"10": result(cvs_per_minute=50.0, p95=40.0)}
+    assert len(check_thresholds(results, 60, 30)) == 2
+    assert check_thresholds(results, None, None) == []
+
+def test_failed_cvs_always_fail_the_check():
+    assert check_thresholds({"10": result(failed_cvs=1)}, None, None) == ["10 CVs: 1 CVs failed to parse or score"]
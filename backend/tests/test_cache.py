@@ -0,0 +1,42 @@
+import os
+import time
+from services.cache import STALE_TEMP_SECONDS, DiskLRUCache
+
+def entries_size(cache):
+    return sum(size for _, _, size in cache._entries())
+
+def test_eviction_leaves_files_being_written_alone(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 1000, extension=".pdf")
+    temp_path = cache.temp_path("report:1:" + "a" * 64)
+    with open(temp_path, "wb") as f:
+        f.write(b"x" * 600)
+
+    # Another request fills the cache past its limit while the report above is still being written
+    for i in range(3):
+        cache.set(f"page:{i}:" + f"{i}" * 64, "y" * 400)
+    assert os.path.exists(temp_path)
+    assert cache.total_bytes == entries_size(cache)
+    # The report took a while to render: the other entries were used after it started
+    for i, (path, _, _) in enumerate(cache._entries()):
+        os.utime(path, (time.time() - 10 + i, time.time() - 10 + i))
+    os.utime(temp_path, (time.time() - 60, time.time() - 60))
+
+    path = cache.add_file("report:1:" + "a" * 64, temp_path)
+    assert os.path.exists(path)
+    assert cache.total_bytes == entries_size(cache) <= 1000
+
+def test_temp_files_are_not_counted_and_stale_ones_are_removed(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 1000)
+    cache.set("page:" + "b" * 64, "z" * 100)
+    fresh_temp = cache.temp_path("page:" + "c" * 64)
+    stale_temp = cache.temp_path("page:" + "d" * 64) + ".old.tmp"
+    for path in (fresh_temp, stale_temp):
+        with open(path, "wb") as f:
+            f.write(b"x" * 500)
+    stale_at = time.time() - STALE_TEMP_SECONDS - 60
+    os.utime(stale_temp, (stale_at, stale_at))
+
+    reopened = DiskLRUCache(str(tmp_path), 1000)
+    assert reopened.total_bytes == 100
+    assert os.path.exists(fresh_temp)
+    assert not os.path.exists(stale_temp)
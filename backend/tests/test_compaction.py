@@ -0,0 +1,22 @@
+from services.compaction import compact_cv, deduplicate_blocks, strip_repeated_page_lines
+
+def test_header_is_kept_on_the_first_page():
+    pages = [
+        "# Jane Doe\nSoftware Engineer\n\nExperience at Acme\n\nPage 1",
+        "# Jane Doe\nSoftware Engineer\n\nEducation at MIT\n\nPage 2",
+        "# Jane Doe\nSoftware Engineer\n\nSkills: Python\n\nPage 3"
+    ]
+    compacted = strip_repeated_page_lines(pages)
+    assert compacted[0] == pages[0]
+    for page in compacted[1:]:
+        assert "Jane Doe" not in page
+        assert "Software Engineer" not in page
+        assert "Page" not in page
+
+    content = compact_cv(pages)["content"]
+    assert content.count("# Jane Doe") == 1
+    assert content.count("Software Engineer") == 1
+
+def test_blocks_differing_in_numbers_are_kept():
+    text = "Score: 55 in 2020\n\nScore: 60 in 2021\n\nScore: 55 in 2020"
+    assert deduplicate_blocks(text) == "Score: 55 in 2020\n\nScore: 60 in 2021"
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from services import llm_service
+from services.llm_service import BaseLLMService, HedgedLLMService, LatencyStats
+
+class StubService(BaseLLMService):
+    """Answers with its provider name after `delay` seconds, or raises `error`"""
+
+    def __init__(self, provider, delay=0.0, error=None):
+        self.provider = provider
+        self.model_name = f"{provider}-model"
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate_response(self, messages, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return self.provider
+
+    async def generate_vision(self, messages, **kwargs):
+        return await self.generate_response(messages, **kwargs)
+
+def ask(service):
+    return asyncio.run(service.generate_response([{"role": "user", "content": "Hello"}]))
+
+def test_hedge_delay_follows_the_latency_percentile(monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_HEDGE_DEFAULT_DELAY", 20.0)
+    monkeypatch.setattr(llm_service, "LLM_HEDGE_MIN_SAMPLES", 20)
+    monkeypatch.setattr(llm_service, "LLM_HEDGE_PERCENTILE", 95.0)
+    stats = LatencyStats()
+    for i in range(19):
+        stats.record_success(i + 1.0)
+    assert stats.hedge_delay() == 20.0
+    for i in range(19, 100):
+        stats.record_success(i + 1.0)
+    assert stats.hedge_delay() == 96.0
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled(monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_HEDGE_DEFAULT_DELAY", 0.05)
+    primary, secondary = StubService("openai", delay=5.0), StubService("google")
+    service = HedgedLLMService(primary, secondary)
+    started_at = time.monotonic()
+    assert ask(service) == "google"
+    assert time.monotonic() - started_at < 1.0
+    assert primary.cancelled == 1
+    stats = service.latency_stats()["openai:text"]
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+
+def test_fast_primary_is_not_hedged(monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_HEDGE_DEFAULT_DELAY", 1.0)
+    primary, secondary = StubService("openai"), StubService("google")
+    assert ask(HedgedLLMService(primary, secondary)) == "openai"
+    assert secondary.calls == 0
+
+def test_failing_primary_fails_over_to_the_secondary(monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_HEDGE_DEFAULT_DELAY", 20.0)
+    primary, secondary = StubService("openai", error=RuntimeError("down")), StubService("google")
+    service = HedgedLLMService(primary, secondary)
+    assert ask(service) == "google"
+    assert service.latency_stats()["openai:text"]["failovers"] == 1
+
+def test_failing_primary_is_skipped_until_its_cooldown_ends(monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_HEDGE_DEFAULT_DELAY", 20.0)
+    monkeypatch.setattr(llm_service, "LLM_FAILOVER_THRESHOLD", 3)
+    monkeypatch.setattr(llm_service, "LLM_FAILOVER_COOLDOWN", 60.0)
+    primary, secondary = StubService("openai", error=RuntimeError("down")), StubService("google")
+    service = HedgedLLMService(primary, secondary)
+    for _ in range(3):
+        assert ask(service) == "google"
+    assert primary.calls == 3
+    assert not service.latency_stats()["openai:text"]["healthy"]
+
+    assert ask(service) == "google"
+    assert primary.calls == 3
+
+    now = time.monotonic()
+    # Only the service's clock moves on; the event loop keeps the real one
+    monkeypatch.setattr(llm_service, "time", SimpleNamespace(monotonic=lambda: now + 61.0))
+    primary.error = None
+    assert ask(service) == "openai"
+    assert primary.calls == 4
+
+def test_error_is_raised_when_both_providers_fail(monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_HEDGE_DEFAULT_DELAY", 20.0)
+    primary = StubService("openai", error=RuntimeError("primary down"))
+    secondary = StubService("google", error=ValueError("secondary down"))
+    with pytest.raises(ValueError, match="secondary down"):
+        ask(HedgedLLMService(primary, secondary))
+    assert (primary.calls, secondary.calls) == (1, 1)
@@ -0,0 +1,19 @@
+import asyncio
+from database import SessionLocal, engine
+from models import Base, JobAnalysis
+from services.analysis import fetch_job_analyses
+
+async def search_prompts(prompts, search):
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        db.add_all([JobAnalysis(prompt=prompt) for prompt in prompts])
+        await db.commit()
+        job_analyses, _ = await fetch_job_analyses(db, search=search)
+    await engine.dispose()
+    return sorted(job_analysis["prompt_snippet"] for job_analysis in job_analyses)
+
+def test_search_matches_wildcards_literally():
+    prompts = ["Sales target 100% met", "Sales target 1000 deals", "Role in data_eng team", "Role in dataXeng team"]
+    assert asyncio.run(search_prompts(prompts, "100%")) == ["Sales target 100% met"]
+    assert asyncio.run(search_prompts([], "data_eng")) == ["Role in data_eng team"]
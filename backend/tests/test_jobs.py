@@ -0,0 +1,103 @@
+import asyncio
+from datetime import timedelta
+from sqlalchemy import func, select
+from database import SessionLocal, engine
+from models import Base, Criterion, CVAnalysis, JobAnalysis
+from services import jobs
+from services.analysis import create_job_analysis
+
+CV_COUNT = 5
+
+async def fake_analyze_files(ocr_service, files, parsed_criteria, job_description,
+                             use_cache=True, on_event=None, batch_scoring=None, profile=None):
+    """Report progress for every CV concurrently, like analyze_files, without OCR or LLM calls"""
+    async def process(index, file):
+        await on_event("parsed", index, {"filename": file.filename})
+        await asyncio.sleep(0)
+        result = {
+            "filename": file.filename,
+            "candidate": f"candidate {index}",
+            "summary": "Summary",
+            "scores": {c["name"]: {"score": 5.0, "explanation": "Explanation"} for c in parsed_criteria}
+        }
+        await on_event("scored", index, result)
+        return result
+
+    return await asyncio.gather(*(process(index, file) for index, file in enumerate(files)))
+
+async def run_background_job():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    async with SessionLocal() as db:
+        criterion = Criterion(name="Background job criterion", description="Description")
+        db.add(criterion)
+        await db.commit()
+        criteria = [{"id": criterion.id, "name": criterion.name, "description": criterion.description, "weight": 1.0}]
+        uploads = [
+            {"filename": f"cv_{i}.pdf", "content_type": "application/pdf", "data": b"%PDF-1.4"}
+            for i in range(CV_COUNT)
+        ]
+        job_analysis, _ = await create_job_analysis(db, criteria, "Job description", status="pending")
+        job_analysis.progress = jobs.initial_progress(uploads)
+        await db.commit()
+        job_analysis_id = job_analysis.id
+
+    await jobs.run_analysis_job({
+        "job_analysis_id": job_analysis_id,
+        "uploads": uploads,
+        "parsed_criteria": criteria,
+        "job_description": "Job description",
+        "use_cache": False,
+        "batch_scoring": None
+    })
+
+    async with SessionLocal() as db:
+        job_analysis = await db.get(JobAnalysis, job_analysis_id)
+        cv_count = (await db.execute(
+            select(func.count(CVAnalysis.id)).where(CVAnalysis.job_analysis_id == job_analysis_id)
+        )).scalar_one()
+    await engine.dispose()
+    return job_analysis, cv_count
+
+def test_background_job_with_several_cvs_completes(monkeypatch):
+    monkeypatch.setattr(jobs, "analyze_files", fake_analyze_files)
+    monkeypatch.setattr(jobs, "OCRService", lambda: None)
+
+    job_analysis, cv_count = asyncio.run(run_background_job())
+
+    assert job_analysis.status == "completed", job_analysis.error
+    assert [entry["status"] for entry in job_analysis.progress] == ["completed"] * CV_COUNT
+    assert cv_count == CV_COUNT
+
+async def run_orphan_recovery():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    stale = jobs.utc_now() - timedelta(seconds=jobs.JOB_LEASE_SECONDS + 60)
+    async with SessionLocal() as db:
+        job_analyses = [
+            # Left behind by a process that stopped
+            JobAnalysis(prompt="Job", status="pending", worker_id="stopped", heartbeat_at=stale),
+            JobAnalysis(prompt="Job", status="processing", worker_id="stopped", heartbeat_at=stale),
+            # Queued before heartbeats were recorded
+            JobAnalysis(prompt="Job", status="processing", created_at=stale),
+            # Running in another live worker process
+            JobAnalysis(prompt="Job", status="processing", worker_id="live", heartbeat_at=jobs.utc_now()),
+            JobAnalysis(prompt="Job", status="completed", worker_id="stopped", heartbeat_at=stale),
+            # Queued by this process, whose heartbeat is renewed below
+            JobAnalysis(prompt="Job", status="pending", worker_id=jobs.WORKER_ID, heartbeat_at=stale)
+        ]
+        db.add_all(job_analyses)
+        await db.commit()
+        ids = [job_analysis.id for job_analysis in job_analyses]
+
+    await jobs.renew_leases()
+    await jobs.fail_orphaned_jobs()
+
+    async with SessionLocal() as db:
+        statuses = [(await db.get(JobAnalysis, job_analysis_id)).status for job_analysis_id in ids]
+    await engine.dispose()
+    return statuses
+
+def test_only_jobs_of_stopped_processes_are_failed():
+    assert asyncio.run(run_orphan_recovery()) == ["failed", "failed", "failed", "processing", "completed", "pending"]
@@ -0,0 +1,27 @@
+from services.ocr_services import OCRService
+from services.rasterizer import PreprocessOptions
+
+class StubLLMService:
+    def __init__(self, provider, vision_model_name):
+        self.provider = provider
+        self.model_name = "text-model"
+        self.vision_model_name = vision_model_name
+
+def ocr_service(provider="openai", vision_model_name="gpt-4o", **options):
+    service = OCRService.__new__(OCRService)
+    service.llm_service = StubLLMService(provider, vision_model_name)
+    service.preprocess_options = PreprocessOptions(provider=provider, **options)
+    return service.build_ocr_cache_namespace()
+
+def test_cache_namespace_changes_with_provider_model_and_preprocessing():
+    namespaces = {
+        ocr_service(),
+        ocr_service(provider="google"),
+        ocr_service(vision_model_name="gpt-4.1"),
+        ocr_service(dpi=150),
+        ocr_service(grayscale=True)
+    }
+    assert len(namespaces) == 5
+
+def test_cache_namespace_ignores_savings_reporting():
+    assert ocr_service(report_savings=True) == ocr_service(report_savings=False)
@@ -0,0 +1,83 @@
+import asyncio
+import io
+import pytest
+from fastapi import UploadFile
+from services import ocr_services
+from services.ocr_services import OCRService
+
+PAGE_COUNT = 6
+
+class StubOCRService(OCRService):
+    """Pages finish in reverse order; `failing_pages` raise from the vision call"""
+
+    def __init__(self, page_concurrency=3, failing_pages=(), text_pages=()):
+        self.page_concurrency = page_concurrency
+        self.failing_pages = set(failing_pages)
+        self.text_pages = list(text_pages)
+        self.rendered_pages = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def ocr_page(self, idx, image_file):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01 * (PAGE_COUNT - image_file["page"]))
+            if image_file["page"] in self.failing_pages:
+                raise RuntimeError(f"Vision call failed for page {image_file['page']}")
+            return f"Markdown of page {image_file['page']}"
+        finally:
+            self.in_flight -= 1
+
+    async def pdf_to_images(self, pdf_file, pdf_bytes, pages=None):
+        for page in pages or range(1, PAGE_COUNT + 1):
+            self.rendered_pages.append(page)
+            yield {"page": page, "image": b"jpeg"}
+
+    async def extract_text_pages(self, pdf_file, pdf_bytes):
+        return self.text_pages
+
+@pytest.fixture(autouse=True)
+def global_semaphore(monkeypatch):
+    # The shared semaphore binds to the event loop that first waits on it
+    monkeypatch.setattr(ocr_services, "_global_ocr_semaphore", None)
+
+async def page_images(count, error_page=None):
+    for page in range(1, count + 1):
+        if page == error_page:
+            yield {"page": page, "error": "Rasterization failed"}
+        else:
+            yield {"page": page, "image": b"jpeg"}
+
+def test_pages_come_back_in_order_with_bounded_concurrency():
+    service = StubOCRService(page_concurrency=3)
+    results = asyncio.run(service.ocr_pages(page_images(PAGE_COUNT)))
+    assert [result["page"] for result in results] == list(range(1, PAGE_COUNT + 1))
+    assert [result["markdown"] for result in results] == [f"Markdown of page {page}" for page in range(1, PAGE_COUNT + 1)]
+    assert service.max_in_flight == 3
+
+def test_failed_pages_are_reported_without_failing_the_others():
+    service = StubOCRService(failing_pages={2})
+    results = asyncio.run(service.ocr_pages(page_images(PAGE_COUNT, error_page=5)))
+    errors = {result["page"]: result["error"] for result in results if result["error"]}
+    assert errors == {2: "Vision call failed for page 2", 5: "Rasterization failed"}
+    assert sum(1 for result in results if result["markdown"]) == PAGE_COUNT - 2
+
+def parse(service):
+    file = UploadFile(file=io.BytesIO(b"%PDF"), filename="cv.pdf")
+    return asyncio.run(service.parse_pdf(file, b"%PDF"))
+
+def test_parse_pdf_fills_page_errors_for_a_failed_page():
+    result = parse(StubOCRService(failing_pages={3}))
+    assert "error" not in result
+    assert result["page_errors"] == [{"page": 3, "error": "Vision call failed for page 3"}]
+    assert len(result["pages"]) == PAGE_COUNT - 1
+
+def test_parse_pdf_sends_only_sparse_text_pages_to_vision():
+    text = "Experienced engineer building data platforms and leading teams. " * 5
+    service = StubOCRService(text_pages=[text, "", text, "", "", text])
+    result = parse(service)
+    assert service.rendered_pages == [2, 4, 5]
+    assert result["text_layer_pages"] == 3
+    assert result["pages"][1] == "Markdown of page 2"
+    assert result["pages"][0].startswith("Experienced engineer")
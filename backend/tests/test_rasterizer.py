@@ -0,0 +1,22 @@
+from PIL import Image, ImageDraw
+from services.rasterizer import PreprocessOptions, preprocess_page
+
+def rendered_page():
+    """A white A4 page at 200 DPI with a block of text-like bars in the middle"""
+    image = Image.new("RGB", (1654, 2339), "white")
+    draw = ImageDraw.Draw(image)
+    for row in range(20):
+        draw.rectangle((400, 800 + row * 30, 1200, 812 + row * 30), fill="black")
+    return image
+
+def test_default_preprocessing_sends_the_page_as_rendered():
+    result = preprocess_page(rendered_page(), PreprocessOptions())
+    assert (result["width"], result["height"]) == (1654, 2339)
+    assert result["stats"]["original_bytes"] is None
+    assert result["stats"]["bytes_saved"] is None
+
+def test_lossy_preprocessing_is_opt_in():
+    result = preprocess_page(rendered_page(), PreprocessOptions(crop_margins=True, downscale=True, report_savings=True))
+    assert max(result["width"], result["height"]) <= 2048
+    assert min(result["width"], result["height"]) <= 768
+    assert result["stats"]["bytes_saved"] > 0
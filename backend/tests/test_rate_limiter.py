@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+from services import rate_limiter
+from services.rate_limiter import AIMDLimiter, RateLimitScheduler, TokenBucket
+
+real_sleep = asyncio.sleep
+
+class FakeClock:
+    """Monotonic clock that only moves when the code under test sleeps"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await real_sleep(0)
+
+class APIError(Exception):
+    def __init__(self, status_code=None, retry_after=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        if retry_after is not None:
+            self.response = type("Response", (), {"headers": {"retry-after": str(retry_after)}})()
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    monkeypatch.setattr(asyncio, "sleep", clock.sleep)
+    # Retries wait the full backoff instead of a random share of it
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: high)
+    return clock
+
+def test_requests_per_minute_are_paced(clock):
+    async def run():
+        bucket = TokenBucket(60)
+        for _ in range(60):
+            await bucket.acquire(1)
+        assert clock.sleeps == []
+        await bucket.acquire(1)
+        await bucket.acquire(1)
+
+    asyncio.run(run())
+    assert clock.sleeps == [pytest.approx(1.0), pytest.approx(1.0)]
+
+def test_tokens_per_minute_are_paced_and_large_requests_capped(clock):
+    async def run():
+        bucket = TokenBucket(1200)
+        await bucket.acquire(1200)
+        await bucket.acquire(600)
+        # More than a minute's worth waits for a full bucket instead of forever
+        await bucket.acquire(5000)
+
+    asyncio.run(run())
+    assert clock.sleeps == [pytest.approx(30.0), pytest.approx(60.0)]
+
+def test_aimd_halves_on_rate_limits_and_grows_while_saturated(clock):
+    limiter = AIMDLimiter(initial=4, minimum=1, maximum=8)
+    started_at = clock.monotonic()
+    clock.now += 1
+    limiter.on_rate_limited(started_at)
+    assert limiter.limit == 2
+    # Requests sent before that decrease were part of the same burst
+    limiter.on_rate_limited(started_at)
+    assert limiter.limit == 2
+    clock.now += 1
+    limiter.on_rate_limited(clock.monotonic())
+    assert limiter.limit == 1
+
+    limiter.on_success(clock.monotonic())
+    assert limiter.limit == 1  # nothing in flight, the limit is not in use
+    limiter.in_flight = 1
+    limiter.on_success(clock.monotonic())
+    assert limiter.limit == 2
+    limiter.in_flight = 2
+    limiter.on_success(clock.monotonic())
+    assert limiter.limit == 2.5
+
+def test_aimd_shrinks_on_slow_responses(clock):
+    limiter = AIMDLimiter(initial=10, minimum=1, maximum=64)
+    started_at = clock.monotonic()
+    clock.now += rate_limiter.LLM_LATENCY_TARGET + 1
+    limiter.on_success(started_at)
+    assert limiter.limit == pytest.approx(9.0)
+
+def scripted_call(outcomes):
+    """Callable raising or returning the given outcomes in order, counting its calls"""
+    calls = []
+
+    async def call():
+        calls.append(len(calls))
+        outcome = outcomes[len(calls) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return call, calls
+
+def test_rate_limited_requests_are_retried_and_halve_the_concurrency(clock):
+    scheduler = RateLimitScheduler("openai", "model", 1000, 1000000)
+    scheduler.concurrency = AIMDLimiter(initial=8, minimum=1, maximum=64)
+    call, calls = scripted_call([APIError(429), "ok"])
+    assert asyncio.run(scheduler.run(call, estimated_tokens=10)) == "ok"
+    assert len(calls) == 2
+    assert clock.sleeps == [rate_limiter.LLM_BACKOFF_BASE]
+    assert scheduler.concurrency.limit == 4
+    assert scheduler.concurrency.in_flight == 0
+
+@pytest.mark.parametrize("error", [APIError(500), APIError(503), TimeoutError()])
+def test_transient_errors_are_retried(clock, error):
+    scheduler = RateLimitScheduler("openai", "model", 1000, 1000000)
+    scheduler.concurrency = AIMDLimiter(initial=8, minimum=1, maximum=64)
+    call, calls = scripted_call([error, "ok"])
+    assert asyncio.run(scheduler.run(call, estimated_tokens=10)) == "ok"
+    assert len(calls) == 2
+    assert clock.sleeps == [rate_limiter.LLM_BACKOFF_BASE]
+    assert scheduler.concurrency.limit == 8
+    assert scheduler.concurrency.in_flight == 0
+
+def test_retry_after_header_is_honoured(clock):
+    scheduler = RateLimitScheduler("openai", "model", 1000, 1000000)
+    call, calls = scripted_call([APIError(429, retry_after=7), "ok"])
+    assert asyncio.run(scheduler.run(call, estimated_tokens=10)) == "ok"
+    assert clock.sleeps == [7.0]
+
+@pytest.mark.parametrize("error", [APIError(400), APIError(401), ValueError("bad response")])
+def test_other_errors_are_raised_right_away_and_release_their_slot(clock, error):
+    scheduler = RateLimitScheduler("openai", "model", 1000, 1000000)
+    call, calls = scripted_call([error, "ok"])
+    with pytest.raises(type(error)):
+        asyncio.run(scheduler.run(call, estimated_tokens=10))
+    assert len(calls) == 1
+    assert clock.sleeps == []
+    assert scheduler.concurrency.in_flight == 0
+
+def test_retries_give_up_after_the_limit(clock):
+    scheduler = RateLimitScheduler("openai", "model", 1000, 1000000)
+    call, calls = scripted_call([APIError(500)] * (rate_limiter.LLM_MAX_RETRIES + 1))
+    with pytest.raises(APIError):
+        asyncio.run(scheduler.run(call, estimated_tokens=10))
+    assert len(calls) == rate_limiter.LLM_MAX_RETRIES + 1
+    assert scheduler.concurrency.in_flight == 0
@@ -0,0 +1,34 @@
+import asyncio
+import uuid
+from services import reports
+from services.cache import DiskLRUCache
+
+def test_report_evicted_before_opening_is_rendered_again(tmp_path, monkeypatch):
+    cache = DiskLRUCache(str(tmp_path), 1024 * 1024, extension=".pdf")
+    monkeypatch.setattr(reports, "get_report_cache", lambda: cache)
+    renders = []
+
+    async def fake_render_report(candidates, output, generated_at=None):
+        renders.append(candidates)
+        with open(output, "wb") as f:
+            f.write(b"%PDF report")
+
+    monkeypatch.setattr(reports, "render_report", fake_render_report)
+    lookups = []
+    get_path = cache.get_path
+
+    def get_evicted_path(key):
+        # The first lookup hits an entry that is evicted right after it is found
+        lookups.append(key)
+        return str(tmp_path / "evicted.pdf") if len(lookups) == 1 else get_path(key)
+
+    monkeypatch.setattr(cache, "get_path", get_evicted_path)
+
+    async def load_candidates():
+        return [{"name": "Candidate"}]
+
+    report = asyncio.run(reports.open_report(uuid.uuid4(), load_candidates))
+    with report:
+        assert report.read() == b"%PDF report"
+    assert len(lookups) == 2
+    assert len(renders) == 1
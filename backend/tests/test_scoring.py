@@ -0,0 +1,103 @@
+import asyncio
+import json
+from services import ocr_services
+from services.ocr_services import OCRService, validate_scores
+
+CRITERIA = [
+    {"name": "Python", "description": "Python experience"},
+    {"name": "Leadership", "description": "Led teams"}
+]
+
+def scores(**values):
+    return {name: {"score": score, "explanation": f"{name} explanation"} for name, score in values.items()}
+
+class ScriptedLLMService:
+    """Answers batched calls with `batch_response` and per-CV calls with `json_responses`, in order"""
+    provider = "openai"
+    model_name = "text-model"
+
+    def __init__(self, batch_response="[]", json_responses=()):
+        self.batch_response = batch_response
+        self.json_responses = list(json_responses)
+        self.json_calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_response(self, messages, **kwargs):
+        return self.batch_response
+
+    async def generate_json(self, messages, schema, name="response", **kwargs):
+        self.json_calls.append(name)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return self.json_responses.pop(0)
+
+def ocr_service(llm_service):
+    service = OCRService.__new__(OCRService)
+    service.llm_service = llm_service
+    return service
+
+def score_batch(service, cvs):
+    return asyncio.run(service.score_cv_batch(cvs, CRITERIA, "Backend engineer", use_cache=False))
+
+def test_incomplete_batched_cvs_are_repaired_concurrently():
+    cvs = [{"filename": f"cv_{i}.pdf", "content": f"CV {i} of the concurrent repair test"} for i in range(3)]
+    batch = [{"filename": cv["filename"], "candidate": "A", "scores": scores(Python=7), "summary": ""} for cv in cvs]
+    llm = ScriptedLLMService(json.dumps(batch), [json.dumps({"scores": scores(Leadership=5)})] * 3)
+    results = score_batch(ocr_service(llm), cvs)
+    assert [result["filename"] for result in results] == [cv["filename"] for cv in cvs]
+    assert all(set(result["scores"]) == {"Python", "Leadership"} for result in results)
+    assert llm.json_calls == ["cv_criterion_scores"] * 3
+    assert llm.max_in_flight == 3
+
+def test_validate_scores_keeps_only_well_formed_scores_of_known_criteria():
+    valid, missing = validate_scores({
+        "Python": {"score": "8.5", "explanation": 3},
+        "Leadership": {"score": 11, "explanation": "Out of range"},
+        "Unknown": {"score": 5, "explanation": "Not a criterion"}
+    }, CRITERIA)
+    assert valid == {"Python": {"score": 8.5, "explanation": ""}}
+    assert missing == [CRITERIA[1]]
+    assert validate_scores("not a dict", CRITERIA) == ({}, CRITERIA)
+    assert validate_scores({"Python": {"explanation": "No score"}, "Leadership": None}, CRITERIA) == ({}, CRITERIA)
+
+def complete(llm, result):
+    cv = {"filename": "cv.pdf", "content": "CV"}
+    return asyncio.run(ocr_service(llm).complete_scores(cv, result, CRITERIA, "Backend engineer"))
+
+def test_missing_criteria_are_requested_again_until_valid(monkeypatch):
+    monkeypatch.setattr(ocr_services, "SCORING_REPAIR_ATTEMPTS", 2)
+    llm = ScriptedLLMService(json_responses=["not json", json.dumps({"scores": scores(Leadership=6)})])
+    result = complete(llm, {"candidate": "A", "summary": "S", "scores": scores(Python=7, Leadership=-1)})
+    assert result["scores"] == {**scores(Python=7.0), **scores(Leadership=6.0)}
+    assert "missing_criteria" not in result
+    assert llm.json_calls == ["cv_criterion_scores"] * 2
+
+def test_criteria_still_missing_after_the_repair_attempts_are_listed(monkeypatch):
+    monkeypatch.setattr(ocr_services, "SCORING_REPAIR_ATTEMPTS", 2)
+    llm = ScriptedLLMService(json_responses=[json.dumps({"scores": {}}), json.dumps({"scores": scores(Leadership=42)})])
+    result = complete(llm, {"candidate": None, "scores": scores(Python=7)})
+    assert result["scores"] == scores(Python=7.0)
+    assert result["missing_criteria"] == ["Leadership"]
+    assert (result["candidate"], result["summary"]) == ("N/A", "")
+    assert len(llm.json_calls) == 2
+
+def test_unparseable_batch_is_scored_one_cv_at_a_time():
+    cvs = [{"filename": f"cv_{i}.pdf", "content": f"CV {i} of the unparseable batch test"} for i in range(2)]
+    full_result = json.dumps({"candidate": "A", "summary": "S", "scores": scores(Python=7, Leadership=5)})
+    llm = ScriptedLLMService("Sorry, I cannot answer in JSON", [full_result] * 2)
+    results = score_batch(ocr_service(llm), cvs)
+    assert llm.json_calls == ["cv_scores"] * 2
+    assert [result["filename"] for result in results] == ["cv_0.pdf", "cv_1.pdf"]
+    assert all("error" not in result and len(result["scores"]) == 2 for result in results)
+
+def test_cvs_missing_from_the_batch_response_are_scored_individually():
+    cvs = [{"filename": f"cv_{i}.pdf", "content": f"CV {i} of the partial batch test"} for i in range(2)]
+    batch = [{"filename": "cv_1.pdf", "candidate": "B", "scores": scores(Python=6, Leadership=4), "summary": ""}]
+    full_result = json.dumps({"candidate": "A", "summary": "S", "scores": scores(Python=7, Leadership=5)})
+    llm = ScriptedLLMService(json.dumps(batch), [full_result])
+    results = score_batch(ocr_service(llm), cvs)
+    assert llm.json_calls == ["cv_scores"]
+    assert [result["candidate"] for result in results] == ["A", "B"]
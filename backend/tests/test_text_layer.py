@@ -0,0 +1,44 @@
+import pytest
+from services import text_layer
+from services.text_layer import is_sparse, text_to_markdown
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    monkeypatch.setattr(text_layer, "TEXT_LAYER_MIN_CHARS", 200)
+    monkeypatch.setattr(text_layer, "TEXT_LAYER_MIN_ALNUM_RATIO", 0.5)
+
+def test_short_text_is_sparse_and_whitespace_does_not_count():
+    assert is_sparse("")
+    assert is_sparse("a" * 199)
+    assert is_sparse(" \n ".join("a" * 199))
+    assert not is_sparse("a" * 200)
+
+def test_garbled_text_is_sparse():
+    assert is_sparse("a" * 100 + "%" * 101)
+    assert not is_sparse("a" * 100 + "%" * 100)
+    assert is_sparse("a" * 300 + "�")
+
+def test_text_to_markdown():
+    text = (
+        "WORK EXPERIENCE\n"
+        "Senior   engineer at Example\n"
+        "• Led the platform team\n"
+        "– Migrated to Postgres\n"
+        "1) Reduced latency\n"
+        "\n\n\n"
+        "Skills: Python, Go."
+    )
+    assert text_to_markdown(text) == (
+        "## Work Experience\n"
+        "\n"
+        "Senior engineer at Example\n"
+        "- Led the platform team\n"
+        "- Migrated to Postgres\n"
+        "1. Reduced latency\n"
+        "\n"
+        "Skills: Python, Go."
+    )
+
+def test_sentences_in_capitals_are_not_headings():
+    assert text_to_markdown("I LED THE TEAM.") == "I LED THE TEAM."
+    assert text_to_markdown("AWS") == "## Aws"
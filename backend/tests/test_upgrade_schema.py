@@ -0,0 +1,25 @@
+from sqlalchemy import create_engine, inspect, text
+from database import upgrade_schema
+from models import Base
+
+def test_upgraded_table_matches_a_fresh_one(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/upgrade.db")
+    with engine.begin() as connection:
+        # job_analyses as first released, before status, progress and profiles existed
+        connection.execute(text(
+            "CREATE TABLE job_analyses (id CHAR(32) PRIMARY KEY, prompt TEXT NOT NULL, created_at DATETIME)"
+        ))
+        connection.execute(text("INSERT INTO job_analyses (id, prompt) VALUES ('1', 'Job')"))
+        upgrade_schema(connection, Base.metadata)
+
+    with engine.connect() as connection:
+        upgraded = {column["name"]: column["nullable"] for column in inspect(connection).get_columns("job_analyses")}
+        status = connection.execute(text("SELECT status FROM job_analyses")).scalar_one()
+    fresh_engine = create_engine(f"sqlite:///{tmp_path}/fresh.db")
+    Base.metadata.create_all(fresh_engine)
+    with fresh_engine.connect() as connection:
+        fresh = {column["name"]: column["nullable"] for column in inspect(connection).get_columns("job_analyses")}
+
+    assert status == "completed"
+    assert upgraded["status"] is False
+    assert {name: upgraded[name] for name in fresh if name != "id"} == {name: fresh[name] for name in fresh if name != "id"}
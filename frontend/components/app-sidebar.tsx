@@ -37,6 +37,8 @@ export function AppSidebar() {
   const [shownCriteria, setShownCriteria] = useState<string[]>([]);
   const [weights, setWeights] = useState<{ [key: string]: number }>({});
   const [jobAnalyses, setJobAnalyses] = useState<JobAnalysis[]>([]);
+  // Cursor of the next history page, null once the last page is loaded
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
   // Fetch criteria from backend
   const fetchCriteria = async () => {
@@ -45,20 +47,29 @@ export function AppSidebar() {
     setCriteria(data.criteria);
   };
 
-  // Fetch job analyses
-  const fetchJobAnalyses = async () => {
+  // Fetch job analyses: the first page, or the page after `cursor` appended to the list
+  const fetchJobAnalyses = async (cursor: string | null = null) => {
     try {
-      const response = await fetch(endpoints.jobAnalyses());
+      const response = await fetch(endpoints.jobAnalyses(cursor));
       if (!response.ok) {
         throw new Error("Failed to fetch job analyses");
       }
       const data = await response.json();
-      setJobAnalyses(data.job_analyses);
+      setJobAnalyses((previous) =>
+        cursor ? [...previous, ...data.job_analyses] : data.job_analyses
+      );
+      setNextCursor(data.next_cursor ?? null);
     } catch (error) {
       console.error("Error fetching job analyses:", error);
     }
   };
 
+  const loadMoreJobAnalyses = async () => {
+    if (nextCursor) {
+      await fetchJobAnalyses(nextCursor);
+    }
+  };
+
   useEffect(() => {
     fetchCriteria();
     fetchJobAnalyses();
@@ -180,7 +191,9 @@ export function AppSidebar() {
         <SidebarGroup className="h-10 w-full mt-auto flex flex-col">
           <HistoryDialog
             jobAnalyses={jobAnalyses}
-            onRefresh={fetchJobAnalyses}
+            onRefresh={() => fetchJobAnalyses()}
+            hasMore={nextCursor !== null}
+            onLoadMore={loadMoreJobAnalyses}
           />
         </SidebarGroup>
       </SidebarContent>
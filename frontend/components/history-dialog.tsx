@@ -1,4 +1,4 @@
-import React from "react";
+import React, { useState } from "react";
 import {
   Dialog,
   DialogContent,
@@ -6,6 +6,7 @@ import {
   DialogTitle,
   DialogTrigger,
 } from "./ui/dialog";
+import { Button } from "./ui/button";
 import { History } from "lucide-react";
 import { useRouter } from "next/navigation";
 import { format } from "date-fns";
@@ -18,10 +19,27 @@ type JobAnalysis = {
 interface HistoryDialogProps {
   jobAnalyses: JobAnalysis[];
   onRefresh: () => Promise<void>;
+  hasMore: boolean;
+  onLoadMore: () => Promise<void>;
 }
 
-export function HistoryDialog({ jobAnalyses, onRefresh }: HistoryDialogProps) {
+export function HistoryDialog({
+  jobAnalyses,
+  onRefresh,
+  hasMore,
+  onLoadMore,
+}: HistoryDialogProps) {
   const router = useRouter();
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await onLoadMore();
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   return (
     <Dialog>
@@ -60,6 +78,16 @@ export function HistoryDialog({ jobAnalyses, onRefresh }: HistoryDialogProps) {
                   </div>
                 </button>
               ))}
+              {hasMore && (
+                <Button
+                  variant="ghost"
+                  className="w-full text-muted-foreground"
+                  onClick={handleLoadMore}
+                  disabled={loadingMore}
+                >
+                  {loadingMore ? "Loading..." : "Load more"}
+                </Button>
+              )}
             </div>
           )}
         </div>
@@ -12,7 +12,10 @@ export function getApiUrl() {
 export const endpoints = {
   results: (id: string) => `${getApiUrl()}/results/${id}`,
   criteria: () => `${getApiUrl()}/criteria`,
-  jobAnalyses: () => `${getApiUrl()}/job-analyses`,
+  jobAnalyses: (cursor?: string | null) =>
+    cursor
+      ? `${getApiUrl()}/job-analyses?cursor=${encodeURIComponent(cursor)}`
+      : `${getApiUrl()}/job-analyses`,
   analyzeCVs: () => `${getApiUrl()}/analyze-cvs`,
   generatePDF: () => `${getApiUrl()}/generate-pdf`,
 } as const;